@@ -5,18 +5,32 @@
 import torch
 import bitsandbytes.functional as F
 
-from copy import deepcopy
 from itertools import chain
-from collections import defaultdict, abc as container_abcs
+from collections import defaultdict, namedtuple, abc as container_abcs
+
+def is_scalar_step(key, value):
+    '''Step counters are kept on the CPU: a device scalar would sync on every step.'''
+    if key == 'step': return True
+    return isinstance(value, torch.Tensor) and value.numel() == 1 and not value.is_floating_point()
+
+def aligned_numel(numel, dtype):
+    # states in a slab start at 256 byte boundaries, the same alignment cudaMalloc gives
+    bits = torch.finfo(dtype).bits if dtype.is_floating_point else torch.iinfo(dtype).bits
+    align = 256*8//bits
+    return numel + (-numel % align)
 
 class MockArgs(object):
     def __init__(self, initial_data):
         for key in initial_data:
             setattr(self, key, initial_data[key])
 
+OptimConfig = namedtuple('OptimConfig', ['lr', 'betas', 'eps', 'weight_decay', 'optim_bits', 'min_8bit_size',
+    'percentile_clipping', 'block_wise', 'max_unorm', 'skip_zeros', 'dynamic_range_expansion'])
+
 
 class GlobalOptimManager(object):
     _instance = None
+    config_version = 0
 
     def __init__(self):
         raise RuntimeError('Call get_instance() instead')
@@ -27,6 +41,7 @@ class GlobalOptimManager(object):
         self.optimizer = None
         self.uses_config_override = False
         self.module_weight_config_triple = []
+        self.config_version += 1
 
     @classmethod
     def get_instance(cls):
@@ -44,6 +59,7 @@ class GlobalOptimManager(object):
             for p_index, p in enumerate(group['params']):
                 if id(p) in self.pid2config:
                     self.index2config[(group_index, p_index)] = self.pid2config[id(p)]
+        self.config_version += 1
 
     def override_config(self, parameters, key=None, value=None, key_value_dict=None):
         '''
@@ -77,18 +93,34 @@ class GlobalOptimManager(object):
             for p in parameters:
                 if id(p) in self.pid2config:self.pid2config[id(p)].update(key_value_dict)
                 else: self.pid2config[id(p)] = key_value_dict
+            self.config_version += 1
 
     def register_module_override(self, module, param_name, config):
         self.module_weight_config_triple.append((module, param_name, config))
+        self.config_version += 1
 
 
 
 class Optimizer8bit(torch.optim.Optimizer):
+    # size of the pinned buffers through which to_gpu() copies CPU states
+    to_gpu_staging_bytes = 64*1024*1024
+    # subclasses that override update_step are only updated with the fused
+    # multi-tensor kernels if they set this to True
+    fuse_custom_update_step = False
+    # version of the state_dict format; version 1 stores the quantization maps
+    # under the top-level 'qmaps' key, checkpoints without a version store them
+    # with every parameter state
+    state_dict_version = 1
 
     def __init__(self, params, defaults, optim_bits=32):
         super(Optimizer8bit, self).__init__(params, defaults)
         self.initialized = False
         self.name2qmap = {}
+        self.device2qmaps = {}
+        self.config_cache = {}
+        self.state_slabs = {}
+        self.unzeroed_states = None
+        self.step_plan = None
 
         self.mng = GlobalOptimManager.get_instance()
         self.non_castable_tensor_keys = set(
@@ -97,30 +129,109 @@ class Optimizer8bit(torch.optim.Optimizer):
                  'new_max1', 'new_max2',
                  'state1', 'state2',
                  'gnorm_vec', 'absmax1', 'absmax2',
-                 'unorm_vec'])
+                 'k1', 'k2', 'unorm_vec'])
+        self.bfloat16_state_keys = set(['absmax1', 'absmax2'])
 
         if optim_bits == 8: self.fill_qmap()
 
     def fill_qmap(self):
         self.name2qmap['dynamic'] = F.create_dynamic_map(signed=True)
         self.name2qmap['udynamic'] = F.create_dynamic_map(signed=False)
+        self.device2qmaps = {}
+
+    def get_qmaps(self, device):
+        '''Returns the (signed, unsigned) quantization maps on device which are shared by all parameters.'''
+        if device not in self.device2qmaps:
+            if 'dynamic' not in self.name2qmap: self.fill_qmap()
+            self.device2qmaps[device] = (self.name2qmap['dynamic'].to(device), self.name2qmap['udynamic'].to(device))
+        return self.device2qmaps[device]
+
+    def state_dict(self):
+        r"""Returns the state of the optimizer as a :class:`dict`.
+
+        The quantization maps are shared by all parameters and are stored only
+        once under the 'qmaps' key instead of once per parameter state. The
+        format is recorded under the 'version' key.
+        """
+        state_dict = super(Optimizer8bit, self).state_dict()
+        state_dict['version'] = self.state_dict_version
+        has_qmaps = False
+        packed_state = {}
+        for k, v in state_dict['state'].items():
+            if 'qmap1' in v or 'qmap2' in v:
+                has_qmaps = True
+                v = {key: value for key, value in v.items() if key not in ('qmap1', 'qmap2')}
+            packed_state[k] = v
+        state_dict['state'] = packed_state
+
+        if has_qmaps:
+            state_dict['qmaps'] = {'qmap1': self.name2qmap['dynamic'], 'qmap2': self.name2qmap['udynamic']}
+        return state_dict
+
+    def fill_state_qmaps(self, state, device):
+        # all 8-bit states on a device use the same quantization maps, which are not stored per parameter
+        for statek, qmapk, idx in [('state1', 'qmap1', 0), ('state2', 'qmap2', 1)]:
+            if statek in state and state[statek].dtype == torch.uint8:
+                state[qmapk] = self.get_qmaps(device)[idx]
 
     def __setstate__(self, state):
         super(Optimizer8bit, self).__setstate__(state)
+        self.config_cache = {}
+        self.step_plan = None
+
+    def add_param_group(self, param_group):
+        super(Optimizer8bit, self).add_param_group(param_group)
+        self.config_cache = {}
+        self.step_plan = None
+
+    def get_step_plan(self):
+        '''
+        Returns the flat list of (group, p, state, gindex, pindex) that step() iterates over.
+
+        The list holds direct references to the state dicts so that step() does not
+        look up self.state by parameter. It is built once and rebuilt only after the
+        parameter groups or the state change. The state is None for parameters
+        without state, see get_plan_state.
+        '''
+        if self.step_plan is None:
+            self.step_plan = [(group, p, self.state.get(p), gindex, pindex)
+                    for gindex, group in enumerate(self.param_groups)
+                    for pindex, p in enumerate(group['params'])]
+        return self.step_plan
+
+    def get_plan_state(self, index):
+        '''
+        Returns the state of the parameter at index of the step plan.
+
+        The state is only created once the parameter has a gradient so that
+        frozen parameters do not end up with empty states in the state_dict.
+        '''
+        group, p, state, gindex, pindex = self.step_plan[index]
+        if state is None:
+            state = self.state[p]
+            self.step_plan[index] = (group, p, state, gindex, pindex)
+        return state
 
 
-    def load_state_dict(self, state_dict):
+    def load_state_dict(self, state_dict, move_to_device=True):
         r"""Loads the optimizer state.
 
         Args:
             state_dict (dict): optimizer state. Should be an object returned
                 from a call to :meth:`state_dict`.
+            move_to_device (bool): if False, the optimizer state stays on the device
+                it was loaded on until the first call to :meth:`step`.
         """
-        # deepcopy, to be consistent with module API
-        state_dict = deepcopy(state_dict)
+        # Containers are copied by cast() so the input state_dict is not modified;
+        # tensors are not deep-copied, which would double peak memory. Only tensors
+        # that are also part of the current state are cloned so that the loaded
+        # state never aliases the state it replaces.
         # Validate the state_dict
+        if state_dict.get('version', 0) > self.state_dict_version:
+            raise ValueError(f"loaded state dict has version {state_dict['version']}, "
+                             f"but only versions up to {self.state_dict_version} are supported")
         groups = self.param_groups
-        saved_groups = state_dict['param_groups']
+        saved_groups = [dict(g) for g in state_dict['param_groups']]
 
         if len(groups) != len(saved_groups):
             raise ValueError("loaded state dict has a different number of "
@@ -136,35 +247,80 @@ class Optimizer8bit(torch.optim.Optimizer):
                   zip(chain.from_iterable((g['params'] for g in saved_groups)),
                       chain.from_iterable((g['params'] for g in groups)))}
 
+        state_ptrs = set(v.data_ptr() for values in self.state.values() for v in values.values()
+                if isinstance(v, torch.Tensor))
+
+        def unalias(value):
+            return value.clone() if value.data_ptr() in state_ptrs else value
+
+        # dispatch on the concrete types first, isinstance checks against the
+        # container_abcs ABCs are slow
+        sequence_types = (list, tuple)
+        atomic_types = (int, float, bool, str, bytes, type(None))
+
         def cast(param, value):
-            r"""Make a deep copy of value, casting all tensors to device of param."""
-            if isinstance(value, torch.Tensor):
-                # Floating-point types are a bit special here. They are the only ones
-                # that are assumed to always match the type of params.
-                if param.is_floating_point() and value.dtype != torch.uint8:
-                    value = value.to(param.dtype)
+            r"""Make a copy of value, casting all tensors to device of param."""
+            value_type = type(value)
+            if value_type in sequence_types:
+                return value_type(cast(param, v) for v in value)
+            elif value_type in atomic_types:
                 return value
             elif isinstance(value, dict):
+                casted = {}
                 for k, v in value.items():
-                    if k in self.non_castable_tensor_keys:
-                        value[k] = v.to(param.device)
+                    if is_scalar_step(k, v):
+                        casted[k] = v
+                    elif k in self.non_castable_tensor_keys:
+                        # the kernels expect bfloat16 blockwise absmax values and float32 for
+                        # every other state that is not quantized; the device and dtype are
+                        # changed with a single copy
+                        if v.dtype == torch.uint8: dtype = torch.uint8
+                        elif k in self.bfloat16_state_keys: dtype = torch.bfloat16
+                        else: dtype = torch.float32
+                        if move_to_device:
+                            casted[k] = unalias(v.to(device=param.device, dtype=dtype, non_blocking=True))
+                        else:
+                            casted[k] = unalias(v.to(dtype=dtype))
                     else:
-                        value[k] = cast(param, v)
+                        casted[k] = cast(param, v)
 
-                return value
+                return casted
+            elif isinstance(value, torch.Tensor):
+                # Floating-point types are a bit special here. They are the only ones
+                # that are assumed to always match the type of params.
+                if param.is_floating_point() and value.dtype != torch.uint8:
+                    value = value.to(param.dtype)
+                return unalias(value)
             elif isinstance(value, container_abcs.Iterable):
-                return type(value)(cast(param, v) for v in value)
+                return value_type(cast(param, v) for v in value)
             else:
                 return value
 
         # Copy state assigned to params (and cast tensors to appropriate types).
         # State that is not assigned to params is copied as is (needed for
         # backward compatibility).
+        if 'qmaps' in state_dict:
+            self.name2qmap['dynamic'] = state_dict['qmaps']['qmap1']
+            self.name2qmap['udynamic'] = state_dict['qmaps']['qmap2']
+            self.device2qmaps = {}
+        else:
+            # older checkpoints store the quantization maps with every parameter state
+            for v in state_dict['state'].values():
+                if 'qmap1' in v or 'qmap2' in v:
+                    if 'dynamic' not in self.name2qmap: self.fill_qmap()
+                    if 'qmap1' in v: self.name2qmap['dynamic'] = v['qmap1']
+                    if 'qmap2' in v: self.name2qmap['udynamic'] = v['qmap2']
+                    self.device2qmaps = {}
+                    break
+
         state = defaultdict(dict)
         for k, v in state_dict['state'].items():
             if k in id_map:
                 param = id_map[k]
+                # the per-parameter maps are replaced by the shared ones of the parameter device
+                v = {key: value for key, value in v.items() if key not in ('qmap1', 'qmap2')}
                 state[param] = cast(param, v)
+                self.fill_state_qmaps(state[param], param.device)
             else:
                 state[k] = v
 
@@ -175,32 +331,76 @@ class Optimizer8bit(torch.optim.Optimizer):
         param_groups = [
             update_group(g, ng) for g, ng in zip(groups, saved_groups)]
         self.__setstate__({'state': state, 'param_groups': param_groups})
+        # the next step() moves the state with to_gpu(), also if this optimizer already stepped
+        if not move_to_device: self.initialized = False
 
     def to_gpu(self):
+        # states on the CPU are copied into one device buffer per device and dtype;
+        # they are packed into a small reused pinned buffer chunk by chunk instead of
+        # with one copy per tensor or one pinned copy of the whole state
+        batches = defaultdict(list)
+        for group, p, values, gindex, pindex in self.get_step_plan():
+            if values is None: continue
+            self.fill_state_qmaps(values, p.device)
+            for k, v in values.items():
+                if k in ('qmap1', 'qmap2'): continue
+                if not isinstance(v, torch.Tensor) or is_scalar_step(k, v) or v.device == p.device: continue
+                if p.device.type == 'cuda' and v.device.type == 'cpu' and v.is_contiguous():
+                    batches[(p.device, v.dtype)].append((values, k, v))
+                else:
+                    values[k] = v.to(p.device)
+
+        for (device, dtype), items in batches.items():
+            numel = sum(v.numel() for values, k, v in items)
+            buffer = torch.empty((numel,), dtype=dtype, device=device)
+            chunk = min(numel, max(1, self.to_gpu_staging_bytes//buffer.element_size()))
+            # two staging buffers: one is filled while the other is copied to the device
+            stagings = [torch.empty((chunk,), dtype=dtype, pin_memory=True) for i in range(2)]
+            events = [None, None]
+            slot, filled, copied = 0, 0, 0
+            for values, k, v in items:
+                src = v.view(-1)
+                offset = 0
+                while offset < src.numel():
+                    if filled == 0 and events[slot] is not None:
+                        # wait until the last copy out of this staging buffer is done
+                        events[slot].synchronize()
+                    n = min(chunk - filled, src.numel() - offset)
+                    stagings[slot].narrow(0, filled, n).copy_(src.narrow(0, offset, n))
+                    filled += n
+                    offset += n
+                    if filled == chunk or copied + filled == numel:
+                        buffer.narrow(0, copied, filled).copy_(stagings[slot].narrow(0, 0, filled), non_blocking=True)
+                        events[slot] = torch.cuda.Event()
+                        events[slot].record(torch.cuda.current_stream(device))
+                        copied += filled
+                        filled = 0
+                        slot = 1 - slot
+
+            offset = 0
+            for values, k, v in items:
+                values[k] = buffer.narrow(0, offset, v.numel()).view(v.shape)
+                offset += v.numel()
+
+    def check_overrides(self):
+        if len(self.mng.module_weight_config_triple) == 0: return
+
+        id2index = {}
         for gindex, group in enumerate(self.param_groups):
             for pindex, p in enumerate(group['params']):
-                if p in self.state:
-                    values = self.state[p]
-                    for k, v in values.items():
-                        if isinstance(v, torch.Tensor):
-                            self.state[p][k] = v.to(p.device)
+                # first occurrence wins
+                id2index.setdefault(id(p), (gindex, pindex))
 
-    def check_overrides(self):
         for module, attr, config in self.mng.module_weight_config_triple:
             pmodule = getattr(module, attr)
             assert pmodule is not None
             assert isinstance(pmodule, torch.Tensor) or isinstance(pmodule, torch.Parameter)
-            found = False
-            for gindex, group in enumerate(self.param_groups):
-                if found: break
-                for pindex, p in enumerate(group['params']):
-                    if found: break
-                    if id(p) == id(pmodule):
-                        # found the matching parameter
-                        # init override
-                        self.mng.pid2config[id(p)] = config
-                        self.mng.index2config[(gindex, pindex)] = self.mng.pid2config[id(p)]
-                        found = True
+            if id(pmodule) in id2index:
+                # found the matching parameter
+                # init override
+                self.mng.pid2config[id(pmodule)] = config
+                self.mng.index2config[id2index[id(pmodule)]] = self.mng.pid2config[id(pmodule)]
+                self.mng.config_version += 1
 
     @torch.no_grad()
     def step(self, closure=None):
@@ -222,37 +422,210 @@ class Optimizer8bit(torch.optim.Optimizer):
             self.to_gpu() # needed for fairseq pure fp16 training
             self.initialized = True
 
-        for gindex, group in enumerate(self.param_groups):
-            for pindex, p in enumerate(group['params']):
-                if p.grad is None:
-                    continue
-                state = self.state[p]
-                if len(state) == 0:
-                    self.init_state(group, p, gindex, pindex)
+        if len(self.mng.index2config) == 0:
+            # without overrides all parameters of a group share the config of the group
+            configs = [self.get_config(gindex, 0, group) for gindex, group in enumerate(self.param_groups)]
+            multi_tensor_buckets = self.step_params(lambda group, gindex, pindex: configs[gindex])
+        else:
+            multi_tensor_buckets = self.step_params(lambda group, gindex, pindex: self.get_config(gindex, pindex, group))
 
-                self.update_step(group, p, gindex, pindex)
+        for key, param_states in multi_tensor_buckets.items():
+            self.update_step_multi_tensor(key, param_states)
 
         return loss
 
-    def get_config(self, gindex, pindex, group):
-        config = {}
-        config['betas'] = group['betas']
-        config['eps'] = group['eps']
-        config['weight_decay'] = group['weight_decay']
-        config['lr'] = group['lr']
-        config['optim_bits'] = self.args.optim_bits
-        config['min_8bit_size'] = self.args.min_8bit_size
-        config['percentile_clipping'] = self.args.percentile_clipping
-        config['block_wise'] = self.args.block_wise
-        config['max_unorm'] = self.args.max_unorm
-        config['skip_zeros'] = self.args.skip_zeros
+    def step_params(self, get_config):
+        '''
+        Updates the parameters that are not fused and returns the multi-tensor buckets.
 
+        get_config(group, gindex, pindex) returns the config of a parameter, step()
+        passes a lookup per group when there are no per-parameter overrides.
+        '''
+        fuse = self.uses_fused_update_step()
+        multi_tensor_buckets = defaultdict(list)
+        for i, (group, p, state, gindex, pindex) in enumerate(self.get_step_plan()):
+            if p.grad is None:
+                continue
+            state = self.get_plan_state(i)
+            if len(state) == 0:
+                self.init_states()
+
+            key = self.get_multi_tensor_key(p, state, get_config(group, gindex, pindex)) if fuse else None
+            if key is None:
+                self.update_step(group, p, gindex, pindex)
+            else:
+                multi_tensor_buckets[key].append((p, state))
+
+        return multi_tensor_buckets
+
+    def uses_fused_update_step(self):
+        '''Returns False if a subclass overrides update_step, which the fused kernels would bypass.'''
+        if self.fuse_custom_update_step: return True
+        return type(self).update_step in (Optimizer2State.update_step, Optimizer1State.update_step)
+
+    def get_config(self, gindex, pindex, group):
+        # the config is rebuilt only if the group hyperparameters (lr schedulers)
+        # or the registered overrides changed since it was last built
+        snapshot = (self.mng.config_version, group['lr'], group['betas'], group['eps'], group['weight_decay'])
+        cached = self.config_cache.get((gindex, pindex))
+        if cached is not None and cached[0] == snapshot:
+            return cached[1]
+
+        config = self.base_config._replace(lr=group['lr'], betas=group['betas'], eps=group['eps'],
+                weight_decay=group['weight_decay'])
         if (gindex, pindex) in self.mng.index2config:
-            config.update(self.mng.index2config[(gindex, pindex)])
+            # keys that are not part of the config, like 'is_sparse', are ignored
+            overrides = self.mng.index2config[(gindex, pindex)]
+            config = config._replace(**{k: v for k, v in overrides.items() if k in OptimConfig._fields})
+
+        self.config_cache[(gindex, pindex)] = (snapshot, config)
         return config
 
+    def get_base_config(self):
+        '''Freezes the settings of self.args, which do not change after the optimizer is created.'''
+        return OptimConfig(lr=None, betas=None, eps=None, weight_decay=None,
+                optim_bits=self.args.optim_bits,
+                min_8bit_size=self.args.min_8bit_size,
+                percentile_clipping=self.args.percentile_clipping,
+                block_wise=self.args.block_wise,
+                max_unorm=self.args.max_unorm,
+                skip_zeros=self.args.skip_zeros,
+                # args objects from older training scripts do not have this field
+                dynamic_range_expansion=getattr(self.args, 'dynamic_range_expansion', False))
+
+    def get_multi_tensor_key(self, p, state, config):
+        '''
+        Returns the bucket key for a fused multi-tensor update of p.
+
+        Small 32-bit and blockwise 8-bit states without gradient clipping and
+        update norms are updated together with all other parameters that share
+        the same key. Returns None if p needs to be updated on its own via
+        update_step, which is faster for states larger than one launch.
+        '''
+        # only states that fit into a single multi-tensor launch of 320 blocks
+        dtype = state['state1'].dtype
+        if dtype == torch.uint8:
+            if 'absmax1' not in state or p.numel() > 320*2048: return None
+        elif dtype == torch.float32:
+            if p.numel() > 320*4096: return None
+        else: return None
+
+        if config.percentile_clipping < 100 or config.max_unorm > 0.0: return None
+
+        key = (p.device, p.grad.dtype, dtype, state['step'], config.lr, tuple(config.betas),
+               config.eps, config.weight_decay, config.skip_zeros)
+        if dtype == torch.uint8:
+            # the quantization maps are shared by all states on the device
+            key += ('k1' in state,)
+        return key
+
+    @torch.no_grad()
+    def update_step_multi_tensor(self, key, param_states):
+        device, gtype, dtype, step, lr, betas, eps, weight_decay, skip_zeros = key[:9]
+
+        params, grads, states1, states2 = [], [], [], []
+        absmax1, absmax2, k1, k2 = [], [], [], []
+        for p, state in param_states:
+            state['step'] += 1
+            params.append(p)
+            grads.append(p.grad)
+            states1.append(state['state1'])
+            if 'state2' in state: states2.append(state['state2'])
+            if dtype == torch.uint8:
+                absmax1.append(state['absmax1'])
+                if 'absmax2' in state: absmax2.append(state['absmax2'])
+                if 'k1' in state: k1.append(state['k1'])
+                if 'k2' in state: k2.append(state['k2'])
+
+        if dtype == torch.uint8:
+            state = param_states[0][1]
+            F.optimizer_update_8bit_blockwise_multi_tensor(self.optimizer_name, grads, params, states1, states2 or None,
+                    betas[0], betas[1], eps, step+1, lr, state['qmap1'], state.get('qmap2'),
+                    absmax1, absmax2 or None, weight_decay, skip_zeros=skip_zeros, k1=k1 or None, k2=k2 or None)
+        elif len(states2) > 0:
+            F.optimizer_update_32bit_multi_tensor(self.optimizer_name, grads, params, states1, betas[0], eps, step+1, lr,
+                    states2, betas[1], weight_decay, skip_zeros=skip_zeros)
+        else:
+            F.optimizer_update_32bit_multi_tensor(self.optimizer_name, grads, params, states1, betas[0], eps, step+1, lr,
+                    None, 0.0, weight_decay, skip_zeros=skip_zeros)
+
+    def get_state_specs(self, group, p, gindex, pindex):
+        raise NotImplementedError(f'get_state_specs method needs to be overidden')
+
+    @torch.no_grad()
+    def init_states(self):
+        '''
+        Initializes the states of all parameters with gradients that have no state yet.
+
+        The states are carved out of one slab per device and dtype and all
+        slabs are zeroed together instead of one allocation and memset per state.
+        '''
+        uninitialized = [(group, p, gindex, pindex) for group, p, state, gindex, pindex in self.get_step_plan()
+                if p.grad is not None and (state is None or len(state) == 0)]
+
+        if type(self).get_state_specs is Optimizer8bit.get_state_specs:
+            # subclasses that only implement init_state allocate their states on their own
+            for group, p, gindex, pindex in uninitialized:
+                self.init_state(group, p, gindex, pindex)
+            return
+
+        numels = defaultdict(int)
+        for group, p, gindex, pindex in uninitialized:
+            for key, shape, dtype in self.get_state_specs(group, p, gindex, pindex):
+                if shape is None:
+                    # non-contiguous parameters get their own state with the same strides
+                    if not p.is_contiguous(): continue
+                    shape = p.shape
+                numels[(p.device, dtype)] += aligned_numel(torch.Size(shape).numel(), dtype)
+
+        self.state_slabs = {}
+        for (device, dtype), numel in numels.items():
+            self.state_slabs[(device, dtype)] = [torch.empty((numel,), dtype=dtype, device=device), 0]
+
+        self.unzeroed_states = [buffer for buffer, offset in self.state_slabs.values()]
+        for group, p, gindex, pindex in uninitialized:
+            self.init_state(group, p, gindex, pindex)
+
+        if hasattr(torch, '_foreach_zero_'):
+            torch._foreach_zero_(self.unzeroed_states)
+        else:
+            for buffer in self.unzeroed_states: buffer.zero_()
+        self.state_slabs = {}
+        self.unzeroed_states = None
+
+    def get_state_buffer(self, p, shape, dtype):
+        '''
+        Returns a zero-initialized state for p.
+
+        A shape of None returns a state with the shape and memory format of p.
+        States handed out during init_states are zeroed once all of them are allocated.
+        '''
+        if shape is None:
+            if not p.is_contiguous():
+                if self.unzeroed_states is None:
+                    return torch.zeros_like(p, memory_format=torch.preserve_format, dtype=dtype, device=p.device)
+                # zeroed by init_states together with the slabs
+                buffer = torch.empty_like(p, memory_format=torch.preserve_format, dtype=dtype, device=p.device)
+                self.unzeroed_states.append(buffer)
+                return buffer
+            shape = p.shape
+
+        numel = torch.Size(shape).numel()
+        slab = self.state_slabs.get((p.device, dtype))
+        if slab is not None and slab[1] + numel <= slab[0].numel():
+            buffer, offset = slab
+            slab[1] = offset + aligned_numel(numel, dtype)
+            return buffer.narrow(0, offset, numel).view(shape)
+
+        return torch.zeros(shape, dtype=dtype, device=p.device)
+
+    @torch.no_grad()
     def init_state(self, group, p, gindex, pindex):
-        raise NotImplementedError(f'init_state method needs to be overidden')
+        state = self.state[p]
+        state['step'] = 0
+        for key, shape, dtype in self.get_state_specs(group, p, gindex, pindex):
+            state[key] = self.get_state_buffer(p, shape, dtype)
+        self.fill_state_qmaps(state, p.device)
 
     def update_step(self, group, p, gindex, pindex):
         raise NotImplementedError(f'The update_step method needs to be overidden')
@@ -261,7 +634,7 @@ class Optimizer2State(Optimizer8bit):
     def __init__(self, optimizer_name, params, lr=1e-3, betas=(0.9, 0.999), eps=1e-8,
             weight_decay=0.0, optim_bits=32, args=None,
             min_8bit_size=4096, percentile_clipping=100, block_wise=True, max_unorm=0.0,
-            skip_zeros=False):
+            skip_zeros=False, dynamic_range_expansion=False):
         if not 0.0 <= lr:
             raise ValueError("Invalid learning rate: {}".format(lr))
         if not 0.0 <= eps:
@@ -288,61 +661,47 @@ class Optimizer2State(Optimizer8bit):
             args['block_wise'] = block_wise
             args['max_unorm'] = max_unorm
             args['skip_zeros'] = skip_zeros
+            args['dynamic_range_expansion'] = dynamic_range_expansion
 
             self.args = MockArgs(args)
         else:
             self.args = args
 
+        self.base_config = self.get_base_config()
         self.optimizer_name = optimizer_name
 
-    @torch.no_grad()
-    def init_state(self, group, p, gindex, pindex):
+    def get_state_specs(self, group, p, gindex, pindex):
         config = self.get_config(gindex, pindex, group)
 
-        if config['optim_bits'] == 32:
+        if config.optim_bits == 32:
             dtype = torch.float32
-        elif config['optim_bits'] == 8:
+        elif config.optim_bits == 8:
             dtype = torch.uint8
-        else: raise NotImplementedError(f'Amount of optimizer bits not supported: {config["optim_bits"]}')
-
-        if p.numel() < config['min_8bit_size']: dtype = torch.float32
-
-        state = self.state[p]
-        state['step'] = 0
-
-        if dtype == torch.float32 or (dtype == torch.uint8 and p.numel() < 4096):
-            state['state1'] = torch.zeros_like(p, memory_format=torch.preserve_format, dtype=torch.float32, device=p.device)
-            state['state2'] = torch.zeros_like(p, memory_format=torch.preserve_format, dtype=torch.float32, device=p.device)
-        elif dtype == torch.uint8:
-            if state['step'] == 0:
-                if 'dynamic' not in self.name2qmap: self.fill_qmap()
-                self.name2qmap['dynamic'] = self.name2qmap['dynamic'].to(p.device)
-                self.name2qmap['udynamic'] = self.name2qmap['udynamic'].to(p.device)
+        else: raise NotImplementedError(f'Amount of optimizer bits not supported: {config.optim_bits}')
 
-            state['state1'] = torch.zeros_like(p, memory_format=torch.preserve_format, dtype=torch.uint8, device=p.device)
-            state['qmap1'] = self.name2qmap['dynamic']
+        # small tensors always use 32-bit states
+        if p.numel() < config.min_8bit_size or p.numel() < 4096: dtype = torch.float32
 
-            state['state2'] = torch.zeros_like(p, memory_format=torch.preserve_format, dtype=torch.uint8, device=p.device)
-            state['qmap2'] = self.name2qmap['udynamic']
-
-            if config['block_wise']:
+        specs = [('state1', None, dtype), ('state2', None, dtype)]
+        if dtype == torch.uint8:
+            if config.block_wise:
                 n = p.numel()
                 blocks = n//2048
                 blocks += 1 if n % 2048 > 0 else 0
 
-                state['absmax1'] = torch.zeros((blocks,), dtype=torch.float32, device=p.device)
-                state['absmax2'] = torch.zeros((blocks,), dtype=torch.float32, device=p.device)
+                specs += [('absmax1', (blocks,), torch.bfloat16), ('absmax2', (blocks,), torch.bfloat16)]
+                if config.dynamic_range_expansion:
+                    specs += [('k1', (blocks,), torch.float32), ('k2', (blocks,), torch.float32)]
             else:
-                state['max1'] = torch.zeros((1,), dtype=torch.float32, device=p.device)
-                state['new_max1'] = torch.zeros((1,), dtype=torch.float32, device=p.device)
-                state['max2'] = torch.zeros((1,), dtype=torch.float32, device=p.device)
-                state['new_max2'] = torch.zeros((1,), dtype=torch.float32, device=p.device)
+                specs += [(k, (1,), torch.float32) for k in ['max1', 'new_max1', 'max2', 'new_max2']]
+
+        if config.percentile_clipping < 100:
+            specs.append(('gnorm_vec', (100,), torch.float32))
 
-        if config['percentile_clipping'] < 100:
-            state['gnorm_vec'] = torch.zeros((100,), device=p.device)
+        if config.max_unorm > 0.0:
+            specs.append(('unorm_vec', (1,), torch.float32))
 
-        if config['max_unorm'] > 0.0:
-            state['unorm_vec'] = torch.zeros((1,), device=p.device)
+        return specs
 
     @torch.no_grad()
     def update_step(self, group, p, gindex, pindex):
@@ -354,38 +713,39 @@ class Optimizer2State(Optimizer8bit):
         state['step'] += 1
         step = state['step']
 
-        if config['percentile_clipping'] < 100:
-            current_gnorm, clip_value, gnorm_scale = F.percentile_clipping(grad, state['gnorm_vec'], step, config['percentile_clipping'])
+        if config.percentile_clipping < 100:
+            current_gnorm, clip_value, gnorm_scale = F.percentile_clipping(grad, state['gnorm_vec'], step, config.percentile_clipping)
         else:
             gnorm_scale = 1.0
 
         if state['state1'].dtype == torch.float:
-            F.optimizer_update_32bit(self.optimizer_name, grad, p, state['state1'], config['betas'][0], config['eps'], step, config['lr'],
-                    state['state2'], config['betas'][1], config['weight_decay'], gnorm_scale,
-                    state['unorm_vec'] if config['max_unorm'] > 0.0 else None, max_unorm=config['max_unorm'], skip_zeros=config['skip_zeros'])
+            F.optimizer_update_32bit(self.optimizer_name, grad, p, state['state1'], config.betas[0], config.eps, step, config.lr,
+                    state['state2'], config.betas[1], config.weight_decay, gnorm_scale,
+                    state['unorm_vec'] if config.max_unorm > 0.0 else None, max_unorm=config.max_unorm, skip_zeros=config.skip_zeros)
 
-        elif state['state1'].dtype == torch.uint8 and not config['block_wise']:
-            F.optimizer_update_8bit(self.optimizer_name, grad, p, state['state1'], state['state2'], config['betas'][0], config['betas'][1],
-                          config['eps'],  step, config['lr'],
+        elif state['state1'].dtype == torch.uint8 and not config.block_wise:
+            F.optimizer_update_8bit(self.optimizer_name, grad, p, state['state1'], state['state2'], config.betas[0], config.betas[1],
+                          config.eps,  step, config.lr,
                           state['qmap1'], state['qmap2'], state['max1'], state['max2'], state['new_max1'], state['new_max2'],
-                          config['weight_decay'], gnorm_scale=gnorm_scale,
-                          unorm_vec=state['unorm_vec'] if config['max_unorm'] > 0.0 else None, max_unorm=config['max_unorm'])
+                          config.weight_decay, gnorm_scale=gnorm_scale,
+                          unorm_vec=state['unorm_vec'] if config.max_unorm > 0.0 else None, max_unorm=config.max_unorm)
 
             # swap maxes
             state['max1'], state['new_max1'] = state['new_max1'], state['max1']
             state['max2'], state['new_max2'] = state['new_max2'], state['max2']
-        elif state['state1'].dtype == torch.uint8 and config['block_wise']:
-            F.optimizer_update_8bit_blockwise(self.optimizer_name, grad, p, state['state1'], state['state2'], config['betas'][0], config['betas'][1],
-                          config['eps'],  step, config['lr'],
+        elif state['state1'].dtype == torch.uint8 and config.block_wise:
+            F.optimizer_update_8bit_blockwise(self.optimizer_name, grad, p, state['state1'], state['state2'], config.betas[0], config.betas[1],
+                          config.eps,  step, config.lr,
                           state['qmap1'], state['qmap2'], state['absmax1'], state['absmax2'],
-                          config['weight_decay'], gnorm_scale=gnorm_scale, skip_zeros=config['skip_zeros'])
+                          config.weight_decay, gnorm_scale=gnorm_scale, skip_zeros=config.skip_zeros,
+                          k1=state.get('k1'), k2=state.get('k2'))
 
 
 class Optimizer1State(Optimizer8bit):
     def __init__(self, optimizer_name, params, lr=1e-3, betas=(0.9, 0.0), eps=1e-8,
             weight_decay=0.0, optim_bits=32, args=None,
             min_8bit_size=4096, percentile_clipping=100, block_wise=True, max_unorm=0.0,
-            skip_zeros=False):
+            skip_zeros=False, dynamic_range_expansion=False):
         if not 0.0 <= lr:
             raise ValueError("Invalid learning rate: {}".format(lr))
         if not 0.0 <= eps:
@@ -408,53 +768,47 @@ class Optimizer1State(Optimizer8bit):
             args['block_wise'] = block_wise
             args['max_unorm'] = max_unorm
             args['skip_zeros'] = skip_zeros
+            args['dynamic_range_expansion'] = dynamic_range_expansion
 
             self.args = MockArgs(args)
         else:
             self.args = args
 
+        self.base_config = self.get_base_config()
         self.optimizer_name = optimizer_name
 
-    @torch.no_grad()
-    def init_state(self, group, p, gindex, pindex):
+    def get_state_specs(self, group, p, gindex, pindex):
         config = self.get_config(gindex, pindex, group)
 
-        if config['optim_bits'] == 32:
+        if config.optim_bits == 32:
             dtype = torch.float32
-        elif config['optim_bits'] == 8:
+        elif config.optim_bits == 8:
             dtype = torch.uint8
-        else: raise NotImplementedError(f'Amount of optimizer bits not supported: {config["optim_bits"]}')
-
-        if p.numel() < config['min_8bit_size']: dtype = torch.float32
+        else: raise NotImplementedError(f'Amount of optimizer bits not supported: {config.optim_bits}')
 
-        state = self.state[p]
-        state['step'] = 0
-
-        if dtype == torch.float32 or (dtype == torch.uint8 and p.numel() < 4096):
-            state['state1'] = torch.zeros_like(p, memory_format=torch.preserve_format, dtype=torch.float32, device=p.device)
-        elif dtype == torch.uint8:
-            if state['step'] == 0:
-                if 'dynamic' not in self.name2qmap: self.fill_qmap()
-                self.name2qmap['dynamic'] = self.name2qmap['dynamic'].to(p.device)
+        # small tensors always use 32-bit states
+        if p.numel() < config.min_8bit_size or p.numel() < 4096: dtype = torch.float32
 
-            state['state1'] = torch.zeros_like(p, memory_format=torch.preserve_format, dtype=torch.uint8, device=p.device)
-            state['qmap1'] = self.name2qmap['dynamic']
-
-            if config['block_wise']:
+        specs = [('state1', None, dtype)]
+        if dtype == torch.uint8:
+            if config.block_wise:
                 n = p.numel()
                 blocks = n//2048
                 blocks += 1 if n % 2048 > 0 else 0
 
-                state['absmax1'] = torch.zeros((blocks,), dtype=torch.float32, device=p.device)
+                specs.append(('absmax1', (blocks,), torch.bfloat16))
+                if config.dynamic_range_expansion:
+                    specs.append(('k1', (blocks,), torch.float32))
             else:
-                state['max1'] = torch.zeros((1,), dtype=torch.float32, device=p.device)
-                state['new_max1'] = torch.zeros((1,), dtype=torch.float32, device=p.device)
+                specs += [('max1', (1,), torch.float32), ('new_max1', (1,), torch.float32)]
+
+        if config.percentile_clipping < 100:
+            specs.append(('gnorm_vec', (100,), torch.float32))
 
-        if config['percentile_clipping'] < 100:
-            state['gnorm_vec'] = torch.zeros((100,), device=p.device)
+        if config.max_unorm > 0.0:
+            specs.append(('unorm_vec', (1,), torch.float32))
 
-        if config['max_unorm'] > 0.0:
-            state['unorm_vec'] = torch.zeros((1,), device=p.device)
+        return specs
 
 
     @torch.no_grad()
@@ -467,26 +821,27 @@ class Optimizer1State(Optimizer8bit):
         state['step'] += 1
         step = state['step']
 
-        if config['percentile_clipping'] < 100:
-            current_gnorm, clip_value, gnorm_scale = F.percentile_clipping(grad, state['gnorm_vec'], step, config['percentile_clipping'])
+        if config.percentile_clipping < 100:
+            current_gnorm, clip_value, gnorm_scale = F.percentile_clipping(grad, state['gnorm_vec'], step, config.percentile_clipping)
         else:
             gnorm_scale = 1.0
 
         if state['state1'].dtype == torch.float:
-            F.optimizer_update_32bit(self.optimizer_name, grad, p, state['state1'], config['betas'][0], config['eps'], step, config['lr'],
-                    None, 0.0, config['weight_decay'], gnorm_scale,
-                    state['unorm_vec'] if config['max_unorm'] > 0.0 else None, max_unorm=config['max_unorm'],
-                    skip_zeros=config['skip_zeros'])
+            F.optimizer_update_32bit(self.optimizer_name, grad, p, state['state1'], config.betas[0], config.eps, step, config.lr,
+                    None, 0.0, config.weight_decay, gnorm_scale,
+                    state['unorm_vec'] if config.max_unorm > 0.0 else None, max_unorm=config.max_unorm,
+                    skip_zeros=config.skip_zeros)
 
-        elif state['state1'].dtype == torch.uint8 and not config['block_wise']:
-            F.optimizer_update_8bit(self.optimizer_name, grad, p, state['state1'], None, config['betas'][0], config['betas'][1],
-                    config['eps'], step, config['lr'], state['qmap1'], None, state['max1'], None, state['new_max1'], None,
-                    config['weight_decay'], gnorm_scale,
-                    state['unorm_vec'] if config['max_unorm'] > 0.0 else None, max_unorm=config['max_unorm'])
+        elif state['state1'].dtype == torch.uint8 and not config.block_wise:
+            F.optimizer_update_8bit(self.optimizer_name, grad, p, state['state1'], None, config.betas[0], config.betas[1],
+                    config.eps, step, config.lr, state['qmap1'], None, state['max1'], None, state['new_max1'], None,
+                    config.weight_decay, gnorm_scale,
+                    state['unorm_vec'] if config.max_unorm > 0.0 else None, max_unorm=config.max_unorm)
 
             state['max1'], state['new_max1'] = state['new_max1'], state['max1']
-        elif state['state1'].dtype == torch.uint8 and config['block_wise']:
-            F.optimizer_update_8bit_blockwise(self.optimizer_name, grad, p, state['state1'], None, config['betas'][0], config['betas'][1],
-                          config['eps'],  step, config['lr'],
+        elif state['state1'].dtype == torch.uint8 and config.block_wise:
+            F.optimizer_update_8bit_blockwise(self.optimizer_name, grad, p, state['state1'], None, config.betas[0], config.betas[1],
+                          config.eps,  step, config.lr,
                           state['qmap1'], None, state['absmax1'], None,
-                          config['weight_decay'], gnorm_scale=gnorm_scale, skip_zeros=config['skip_zeros'])
+                          config.weight_decay, gnorm_scale=gnorm_scale, skip_zeros=config.skip_zeros,
+                          k1=state.get('k1'))
@@ -907,6 +907,111 @@ __global__ void kOptimizer32bit1State(T *g, T *p,
   }
 }
 
+template<typename T, int OPTIMIZER>
+__launch_bounds__(TH, 1)
+__global__ void kOptimizer32bitMultiTensor(TensorListMetadata32bit<T> tl,
+                const float beta1, const float beta2, const float eps, const float weight_decay,
+                const int step, const float lr, const bool skip_zeros)
+{
+
+  // each block processes one chunk of TH*NUM_PER_THREAD values of a single tensor
+  const int tensor_idx = tl.block_to_tensor[blockIdx.x];
+  const int i = tl.block_to_chunk[blockIdx.x]*TH*NUM_PER_THREAD;
+  const int n = tl.n[tensor_idx];
+  T* g = tl.g[tensor_idx];
+  T* p = tl.p[tensor_idx];
+  float* state1 = tl.state1[tensor_idx];
+  float* state2 = tl.state2[tensor_idx];
+  const int valid_items = n - i >= (TH*NUM_PER_THREAD) ? (TH*NUM_PER_THREAD) : n - i;
+
+  T g_vals[NUM_PER_THREAD];
+  T p_vals[NUM_PER_THREAD];
+
+  float s1_vals[NUM_PER_THREAD];
+  float s2_vals[NUM_PER_THREAD];
+
+  const float correction1 = 1.0f - powf(beta1, step);
+  const float correction2 = sqrtf(1.0f - powf(beta2, step));
+  const float step_size = -lr*correction2/correction1;
+
+  typedef cub::BlockLoad<T, TH, NUM_PER_THREAD, cub::BLOCK_LOAD_WARP_TRANSPOSE> Load;
+  typedef cub::BlockStore<T, TH, NUM_PER_THREAD, cub::BLOCK_STORE_WARP_TRANSPOSE> Store;
+
+  typedef cub::BlockLoad<float, TH, NUM_PER_THREAD, cub::BLOCK_LOAD_WARP_TRANSPOSE> LoadFloat;
+  typedef cub::BlockStore<float, TH, NUM_PER_THREAD, cub::BLOCK_STORE_WARP_TRANSPOSE> StoreFloat;
+
+  __shared__ union {
+      typename Load::TempStorage load;
+      typename Store::TempStorage store;
+      typename LoadFloat::TempStorage loadf;
+      typename StoreFloat::TempStorage storef;
+  } temp_storage;
+
+  Load(temp_storage.load).Load(&(g[i]), g_vals, valid_items);
+  __syncthreads();
+  LoadFloat(temp_storage.loadf).Load(&(state1[i]), s1_vals, valid_items);
+  if(OPTIMIZER == ADAM)
+  {
+    __syncthreads();
+    LoadFloat(temp_storage.loadf).Load(&(state2[i]), s2_vals, valid_items);
+  }
+  __syncthreads();
+  Load(temp_storage.load).Load(&(p[i]), p_vals, valid_items);
+
+  // 1-state optimizers use L2 weight decay, Adam uses decoupled weight decay
+  if(OPTIMIZER != ADAM && weight_decay > 0.0f)
+  {
+    # pragma unroll 4
+    for(unsigned int j = 0; j < NUM_PER_THREAD; j++)
+      g_vals[j] = (float)g_vals[j] + (((float)p_vals[j])*weight_decay);
+  }
+
+  # pragma unroll 4
+  for(unsigned int j = 0; j < NUM_PER_THREAD; j++)
+  {
+      if(!skip_zeros || (skip_zeros && ((float)g_vals[j] != 0.0f)))
+      {
+        switch(OPTIMIZER)
+        {
+            case ADAM:
+                s1_vals[j] = s1_vals[j]*beta1 + ((1.0f -beta1)*((float)g_vals[j]));
+                s2_vals[j] = s2_vals[j]*beta2 + ((1.0f -beta2)*(((float)g_vals[j])*((float)g_vals[j])));
+                p_vals[j] = ((float)p_vals[j]) + (step_size*(s1_vals[j]/(sqrtf(s2_vals[j])+(eps*correction2))));
+
+                if(weight_decay > 0.0f)
+                    p_vals[j] = ((float)p_vals[j])*(1.0f-(lr*weight_decay));
+                break;
+            case MOMENTUM:
+                if(step == 1)
+                  s1_vals[j] = (float)g_vals[j];
+                else
+                  s1_vals[j] = s1_vals[j]*beta1 + ((float)g_vals[j]);
+
+                p_vals[j] = ((float)p_vals[j]) + (-lr*(s1_vals[j]));
+                break;
+            case RMSPROP:
+                s1_vals[j] = s1_vals[j]*beta1 + ((1.0f-beta1)*((float)g_vals[j])*((float)g_vals[j]));
+                p_vals[j] = ((float)p_vals[j]) - (lr*__fdividef((float)g_vals[j],sqrtf((float)s1_vals[j])+eps));
+                break;
+            case ADAGRAD:
+                s1_vals[j] = s1_vals[j] + ((float)g_vals[j])*((float)g_vals[j]);
+                p_vals[j] = ((float)p_vals[j]) - lr*__fdividef((float)g_vals[j],sqrtf((float)s1_vals[j])+eps);
+                break;
+        }
+      }
+  }
+
+  __syncthreads();
+  Store(temp_storage.store).Store(&(p[i]), p_vals, valid_items);
+  __syncthreads();
+  StoreFloat(temp_storage.storef).Store(&(state1[i]), s1_vals, valid_items);
+  if(OPTIMIZER == ADAM)
+  {
+    __syncthreads();
+    StoreFloat(temp_storage.storef).Store(&(state2[i]), s2_vals, valid_items);
+  }
+}
+
 
 #define NUM8BIT 16
 #define NUM_THREADS 256
@@ -1390,23 +1495,56 @@ __global__ void kPercentileClipping(T * __restrict__ g, float *gnorm_vec, int st
 }
 
 
+// the absmax values of the blockwise optimizers are stored as bfloat16, i.e. the upper
+// 16 bits of a float32, which does not need the cuda_bf16 header of CUDA 11
+__device__ __forceinline__ float dBFloat16ToFloat(const unsigned short x)
+{
+  return __uint_as_float(((unsigned int)x) << 16);
+}
+
+// rounds up the magnitude so that all values of a block stay within [-absmax, absmax]
+__device__ __forceinline__ unsigned short dFloatToBFloat16Up(const float x)
+{
+  unsigned int bits = __float_as_uint(x);
+  if((bits & 0xffff) != 0)
+    bits += 0x10000;
+  return (unsigned short)(bits >> 16);
+}
+
+// dynamic range expansion: blocks of small dynamic range are stored as sign(x)*|x|^k
+// so that they span DRE_RANGE of the quantization map instead of only its top bins
+#define DRE_RANGE 1000.0f
+#define DRE_MAX_K 8.0f
+
+__device__ __forceinline__ float dExpansionExponent(const float absmax, const float absmin)
+{
+  if(absmin <= 0.0f || absmin >= absmax || absmin == FLT_MAX)
+    return 1.0f;
+
+  return fminf(fmaxf(__fdividef(__logf(DRE_RANGE), __logf(absmax/absmin)), 1.0f), DRE_MAX_K);
+}
+
+__device__ __forceinline__ float dExpand(const float x, const float k)
+{
+  return copysignf(__powf(fabsf(x), k), x);
+}
+
 #define LANES 2
 #define QUAD 3
+// processes the blocks base_idx, base_idx + stride, ... < n_full of one tensor
 template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH>
-__launch_bounds__(256, 3)
-__global__ void
-kOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char* state1, unsigned char* state2,
+__device__ __forceinline__ void
+dOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char* state1, unsigned char* state2,
                 const float beta1, const float beta2,
                 const float eps, const int step, const float lr,
                 float* __restrict__ const quantiles1, float* __restrict__ const quantiles2,
-                float* absmax1, float* absmax2, 
+                unsigned short* absmax1, unsigned short* absmax2, 
+                float* k1, float* k2,
                 float weight_decay,
-                const float gnorm_scale, const bool skip_zeros, const int n)
+                const float gnorm_scale, const bool skip_zeros, const int n,
+                const unsigned int base_idx, const unsigned int n_full, const unsigned int stride)
 {
 
-    //const int n_full = n + (n%BLOCK_SIZE);
-    const int n_full = gridDim.x * BLOCK_SIZE;
-    const int base_idx = (blockIdx.x * BLOCK_SIZE);
     int valid_items = 0;
     float g_val = 0.0f;
     float s1_vals[N_PER_TH];
@@ -1418,6 +1556,11 @@ kOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char
     const int lane_id = threadIdx.x % LANES;
     float new_local_abs_max1 = -FLT_MAX;
     float new_local_abs_max2 = -FLT_MAX;
+    float new_local_abs_min1 = FLT_MAX;
+    float new_local_abs_min2 = FLT_MAX;
+    float new_k1 = 1.0f;
+    float new_k2 = 1.0f;
+    const bool expand = k1 != NULL;
     float quadrants1[QUAD];
     float quadrants2[QUAD];
 
@@ -1436,8 +1579,8 @@ kOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char
     typedef cub::BlockReduce<float, BLOCK_SIZE/N_PER_TH> BlockReduce2;
     __shared__ typename BlockReduce1::TempStorage reduce1;
     __shared__ typename BlockReduce2::TempStorage reduce2;
-    __shared__ float smem_exchange1[1];
-    __shared__ float smem_exchange2[1];
+    __shared__ float smem_exchange1[2];
+    __shared__ float smem_exchange2[2];
 
     __shared__ union {
         typename LoadT::TempStorage loadh;
@@ -1467,7 +1610,7 @@ kOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char
     }
 
 
-    for (unsigned int i = base_idx; i < n_full; i += gridDim.x*BLOCK_SIZE)
+    for (unsigned int i = base_idx; i < n_full; i += stride)
     {
         // loads: 0.23 -> 0.85/1.44
         valid_items = n - i >= BLOCK_SIZE ? BLOCK_SIZE : n - i;
@@ -1480,6 +1623,13 @@ kOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char
 
         new_local_abs_max1 = -FLT_MAX;
         new_local_abs_max2 = -FLT_MAX;
+        new_local_abs_min1 = FLT_MAX;
+        new_local_abs_min2 = FLT_MAX;
+        const float block_absmax1 = dBFloat16ToFloat(absmax1[i/BLOCK_SIZE]);
+        const float block_absmax2 = dBFloat16ToFloat(absmax2[i/BLOCK_SIZE]);
+        // k is zero before the first update
+        const float inv_k1 = expand && k1[i/BLOCK_SIZE] > 0.0f ? 1.0f/k1[i/BLOCK_SIZE] : 1.0f;
+        const float inv_k2 = expand && k2[i/BLOCK_SIZE] > 0.0f ? 1.0f/k2[i/BLOCK_SIZE] : 1.0f;
 
         //  update: 2.48/1.57 -> 2.51/1.60
         # pragma unroll N_PER_TH
@@ -1489,34 +1639,66 @@ kOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char
             g_val *= gnorm_scale;
 						if(!skip_zeros || (skip_zeros && ((float)g_vals[j] != 0.0f)))
 						{
-							s1_vals[j] = smem_quantiles1[lane_id][c1s[j]]*absmax1[i/BLOCK_SIZE];
+							s1_vals[j] = smem_quantiles1[lane_id][c1s[j]];
+							s2_vals[j] = smem_quantiles2[lane_id][c2s[j]];
+							if(expand)
+							{
+								s1_vals[j] = dExpand(s1_vals[j], inv_k1);
+								s2_vals[j] = dExpand(s2_vals[j], inv_k2);
+							}
+
+							s1_vals[j] = s1_vals[j]*block_absmax1;
 							s1_vals[j] = (s1_vals[j]*beta1) + (((1.0f-beta1)*g_val));
 
-							s2_vals[j] = smem_quantiles2[lane_id][c2s[j]]*absmax2[i/BLOCK_SIZE];
+							s2_vals[j] = s2_vals[j]*block_absmax2;
 							s2_vals[j] = (s2_vals[j]*beta2) + (((1.0f-beta2)*g_val*g_val));
 						}
 
             new_local_abs_max1 = fmaxf(new_local_abs_max1, fabsf(s1_vals[j]));
             new_local_abs_max2 = fmaxf(new_local_abs_max2, fabsf(s2_vals[j]));
+            if(expand)
+            {
+              // zeros are exactly representable and do not bound the range
+              if(s1_vals[j] != 0.0f) new_local_abs_min1 = fminf(new_local_abs_min1, fabsf(s1_vals[j]));
+              if(s2_vals[j] != 0.0f) new_local_abs_min2 = fminf(new_local_abs_min2, fabsf(s2_vals[j]));
+            }
         }
 
 
         //  reduce: 2.51/1.60 -> 2.67/1.69
         new_local_abs_max1 = BlockReduce1(reduce1).Reduce(new_local_abs_max1, cub::Max());
         new_local_abs_max2 = BlockReduce2(reduce2).Reduce(new_local_abs_max2, cub::Max());
+        if(expand)
+        {
+          __syncthreads();
+          new_local_abs_min1 = BlockReduce1(reduce1).Reduce(new_local_abs_min1, cub::Min());
+          new_local_abs_min2 = BlockReduce2(reduce2).Reduce(new_local_abs_min2, cub::Min());
+        }
 
         if(threadIdx.x == 0)
         {
+          // quantize with the absmax that is stored
+          new_local_abs_max1 = dBFloat16ToFloat(dFloatToBFloat16Up(new_local_abs_max1));
+          new_local_abs_max2 = dBFloat16ToFloat(dFloatToBFloat16Up(new_local_abs_max2));
           smem_exchange1[0] = new_local_abs_max1;
           smem_exchange2[0] = new_local_abs_max2;
+          smem_exchange1[1] = expand ? dExpansionExponent(new_local_abs_max1, new_local_abs_min1) : 1.0f;
+          smem_exchange2[1] = expand ? dExpansionExponent(new_local_abs_max2, new_local_abs_min2) : 1.0f;
         }
 
         __syncthreads();
 
+        new_k1 = smem_exchange1[1];
+        new_k2 = smem_exchange2[1];
         if(threadIdx.x == 0)
         {
-          absmax1[i/BLOCK_SIZE] = new_local_abs_max1;
-          absmax2[i/BLOCK_SIZE] = new_local_abs_max2;
+          absmax1[i/BLOCK_SIZE] = dFloatToBFloat16Up(new_local_abs_max1);
+          absmax2[i/BLOCK_SIZE] = dFloatToBFloat16Up(new_local_abs_max2);
+          if(expand)
+          {
+            k1[i/BLOCK_SIZE] = new_k1;
+            k2[i/BLOCK_SIZE] = new_k2;
+          }
         }
         else
         {
@@ -1546,8 +1728,16 @@ kOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char
         # pragma unroll N_PER_TH 
         for(unsigned int j = 0; j < N_PER_TH; j++)
         {
-            c1s[j] = quantize_2D<1>(quadrants1, smem_quantiles1[lane_id], __fdividef(s1_vals[j],new_local_abs_max1));
-            c2s[j] = quantize_2D<0>(quadrants2, smem_quantiles2[lane_id], __fdividef(s2_vals[j],new_local_abs_max2));
+            if(expand)
+            {
+              c1s[j] = quantize_2D<1>(quadrants1, smem_quantiles1[lane_id], dExpand(__fdividef(s1_vals[j],new_local_abs_max1), new_k1));
+              c2s[j] = quantize_2D<0>(quadrants2, smem_quantiles2[lane_id], dExpand(__fdividef(s2_vals[j],new_local_abs_max2), new_k2));
+            }
+            else
+            {
+              c1s[j] = quantize_2D<1>(quadrants1, smem_quantiles1[lane_id], __fdividef(s1_vals[j],new_local_abs_max1));
+              c2s[j] = quantize_2D<0>(quadrants2, smem_quantiles2[lane_id], __fdividef(s2_vals[j],new_local_abs_max2));
+            }
 
             // make sure state1 term has still the same sign after quantization
             // (not needed for state2 term which has only positive values)
@@ -1568,29 +1758,66 @@ kOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char
 }
 
 
-#define LANES 2
-#define QUAD 3
 template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH>
 __launch_bounds__(256, 3)
 __global__ void
-kOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char* state1,
+kOptimizerStatic8bit2StateBlockwise(T* p, T* __restrict__ const g, unsigned char* state1, unsigned char* state2,
                 const float beta1, const float beta2,
                 const float eps, const int step, const float lr,
-                float* __restrict__ const quantiles1,
-                float* absmax1,
+                float* __restrict__ const quantiles1, float* __restrict__ const quantiles2,
+                unsigned short* absmax1, unsigned short* absmax2, 
+                float* k1, float* k2,
                 float weight_decay,
                 const float gnorm_scale, const bool skip_zeros, const int n)
 {
+  dOptimizerStatic8bit2StateBlockwise<T, OPTIMIZER, BLOCK_SIZE, N_PER_TH>(p, g, state1, state2, beta1, beta2, eps, step, lr,
+      quantiles1, quantiles2, absmax1, absmax2, k1, k2, weight_decay, gnorm_scale, skip_zeros, n,
+      blockIdx.x*BLOCK_SIZE, gridDim.x*BLOCK_SIZE, gridDim.x*BLOCK_SIZE);
+}
+
+// every block processes one BLOCK_SIZE chunk of one tensor of the list
+template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH>
+__launch_bounds__(256, 3)
+__global__ void
+kOptimizerStatic8bit2StateBlockwiseMultiTensor(TensorListMetadata8bit<T> tl,
+                const float beta1, const float beta2,
+                const float eps, const int step, const float lr,
+                float* __restrict__ const quantiles1, float* __restrict__ const quantiles2,
+                float weight_decay, const bool skip_zeros)
+{
+  const int t = tl.block_to_tensor[blockIdx.x];
+  const unsigned int base_idx = tl.block_to_chunk[blockIdx.x]*BLOCK_SIZE;
+  dOptimizerStatic8bit2StateBlockwise<T, OPTIMIZER, BLOCK_SIZE, N_PER_TH>(tl.p[t], tl.g[t], tl.state1[t], tl.state2[t], beta1, beta2, eps, step, lr,
+      quantiles1, quantiles2, tl.absmax1[t], tl.absmax2[t], tl.k1[t], tl.k2[t], weight_decay, 1.0f, skip_zeros, tl.n[t],
+      base_idx, base_idx + 1, BLOCK_SIZE);
+}
+
+
+#define LANES 2
+#define QUAD 3
+// processes the blocks base_idx, base_idx + stride, ... < n_full of one tensor
+template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH>
+__device__ __forceinline__ void
+dOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char* state1,
+                const float beta1, const float beta2,
+                const float eps, const int step, const float lr,
+                float* __restrict__ const quantiles1,
+                unsigned short* absmax1,
+                float* k1,
+                float weight_decay,
+                const float gnorm_scale, const bool skip_zeros, const int n,
+                const unsigned int base_idx, const unsigned int n_full, const unsigned int stride)
+{
 
-    //const int n_full = n + (n%BLOCK_SIZE);
-    const int n_full = gridDim.x * BLOCK_SIZE;
-    const int base_idx = (blockIdx.x * BLOCK_SIZE);
     int valid_items = 0;
     float g_val = 0.0f;
     float s1_vals[N_PER_TH];
     // 2-5%
     const int lane_id = threadIdx.x % LANES;
     float new_local_abs_max1 = -FLT_MAX;
+    float new_local_abs_min1 = FLT_MAX;
+    float new_k1 = 1.0f;
+    const bool expand = k1 != NULL;
     float quadrants1[QUAD];
 
     unsigned char c1s[N_PER_TH];
@@ -1606,7 +1833,7 @@ kOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char
     __shared__ float smem_quantiles1[LANES][257];
     typedef cub::BlockReduce<float, BLOCK_SIZE/N_PER_TH> BlockReduce1;
     __shared__ typename BlockReduce1::TempStorage reduce1;
-    __shared__ float smem_exchange1[1];
+    __shared__ float smem_exchange1[2];
 
     __shared__ union {
         typename LoadT::TempStorage loadh;
@@ -1628,7 +1855,7 @@ kOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char
     for(int k = 0; k < QUAD; k++)
       quadrants1[k] = smem_quantiles1[lane_id][(k*256/(QUAD+1)) + (256/(QUAD+1)-1)];
 
-    for (unsigned int i = base_idx; i < n_full; i += gridDim.x*BLOCK_SIZE)
+    for (unsigned int i = base_idx; i < n_full; i += stride)
     {
         // loads: 0.23 -> 0.85/1.44
         valid_items = n - i >= BLOCK_SIZE ? BLOCK_SIZE : n - i;
@@ -1640,6 +1867,10 @@ kOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char
         LoadT(temp_storage.loadh).Load(&(p[i]), p_vals, valid_items, (T)0.0f);
 
         new_local_abs_max1 = -FLT_MAX;
+        new_local_abs_min1 = FLT_MAX;
+        const float block_absmax1 = dBFloat16ToFloat(absmax1[i/BLOCK_SIZE]);
+        // k is zero before the first update
+        const float inv_k1 = expand && k1[i/BLOCK_SIZE] > 0.0f ? 1.0f/k1[i/BLOCK_SIZE] : 1.0f;
 
         //  update: 2.48/1.57 -> 2.51/1.60
         # pragma unroll N_PER_TH
@@ -1652,7 +1883,10 @@ kOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char
 							if(weight_decay > 0.0f)
 								g_val += ((float)p_vals[j])*weight_decay;
 
-							s1_vals[j] = smem_quantiles1[lane_id][c1s[j]]*absmax1[i/BLOCK_SIZE];
+							s1_vals[j] = smem_quantiles1[lane_id][c1s[j]];
+							if(expand)
+								s1_vals[j] = dExpand(s1_vals[j], inv_k1);
+							s1_vals[j] = s1_vals[j]*block_absmax1;
 
 							switch(OPTIMIZER)
 							{
@@ -1672,19 +1906,37 @@ kOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char
 						}
 
             new_local_abs_max1 = fmaxf(new_local_abs_max1, fabsf(s1_vals[j]));
+            // zeros are exactly representable and do not bound the range
+            if(expand && s1_vals[j] != 0.0f)
+              new_local_abs_min1 = fminf(new_local_abs_min1, fabsf(s1_vals[j]));
         }
 
 
         //  reduce: 2.51/1.60 -> 2.67/1.69
         new_local_abs_max1 = BlockReduce1(reduce1).Reduce(new_local_abs_max1, cub::Max());
+        if(expand)
+        {
+          __syncthreads();
+          new_local_abs_min1 = BlockReduce1(reduce1).Reduce(new_local_abs_min1, cub::Min());
+        }
 
         if(threadIdx.x == 0)
+        {
+          // quantize with the absmax that is stored
+          new_local_abs_max1 = dBFloat16ToFloat(dFloatToBFloat16Up(new_local_abs_max1));
           smem_exchange1[0] = new_local_abs_max1;
+          smem_exchange1[1] = expand ? dExpansionExponent(new_local_abs_max1, new_local_abs_min1) : 1.0f;
+        }
 
         __syncthreads();
 
+        new_k1 = smem_exchange1[1];
         if(threadIdx.x == 0)
-          absmax1[i/BLOCK_SIZE] = new_local_abs_max1;
+        {
+          absmax1[i/BLOCK_SIZE] = dFloatToBFloat16Up(new_local_abs_max1);
+          if(expand)
+            k1[i/BLOCK_SIZE] = new_k1;
+        }
         else
           new_local_abs_max1 = smem_exchange1[0];
 
@@ -1719,7 +1971,10 @@ kOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char
         # pragma unroll N_PER_TH 
         for(unsigned int j = 0; j < N_PER_TH; j++)
         {
-            c1s[j] = quantize_2D<1>(quadrants1, smem_quantiles1[lane_id], __fdividef(s1_vals[j],new_local_abs_max1));
+            if(expand)
+              c1s[j] = quantize_2D<1>(quadrants1, smem_quantiles1[lane_id], dExpand(__fdividef(s1_vals[j],new_local_abs_max1), new_k1));
+            else
+              c1s[j] = quantize_2D<1>(quadrants1, smem_quantiles1[lane_id], __fdividef(s1_vals[j],new_local_abs_max1));
 
             // make sure state1 term has still the same sign after quantization
             // (not needed for state2 term which has only positive values)
@@ -1737,6 +1992,40 @@ kOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char
     }
 }
 
+template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH>
+__launch_bounds__(256, 3)
+__global__ void
+kOptimizerStatic8bit1StateBlockwise(T* p, T* __restrict__ const g, unsigned char* state1,
+                const float beta1, const float beta2,
+                const float eps, const int step, const float lr,
+                float* __restrict__ const quantiles1,
+                unsigned short* absmax1,
+                float* k1,
+                float weight_decay,
+                const float gnorm_scale, const bool skip_zeros, const int n)
+{
+  dOptimizerStatic8bit1StateBlockwise<T, OPTIMIZER, BLOCK_SIZE, N_PER_TH>(p, g, state1, beta1, beta2, eps, step, lr,
+      quantiles1, absmax1, k1, weight_decay, gnorm_scale, skip_zeros, n,
+      blockIdx.x*BLOCK_SIZE, gridDim.x*BLOCK_SIZE, gridDim.x*BLOCK_SIZE);
+}
+
+// every block processes one BLOCK_SIZE chunk of one tensor of the list
+template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH>
+__launch_bounds__(256, 3)
+__global__ void
+kOptimizerStatic8bit1StateBlockwiseMultiTensor(TensorListMetadata8bit<T> tl,
+                const float beta1, const float beta2,
+                const float eps, const int step, const float lr,
+                float* __restrict__ const quantiles1,
+                float weight_decay, const bool skip_zeros)
+{
+  const int t = tl.block_to_tensor[blockIdx.x];
+  const unsigned int base_idx = tl.block_to_chunk[blockIdx.x]*BLOCK_SIZE;
+  dOptimizerStatic8bit1StateBlockwise<T, OPTIMIZER, BLOCK_SIZE, N_PER_TH>(tl.p[t], tl.g[t], tl.state1[t], beta1, beta2, eps, step, lr,
+      quantiles1, tl.absmax1[t], tl.k1[t], weight_decay, 1.0f, skip_zeros, tl.n[t],
+      base_idx, base_idx + 1, BLOCK_SIZE);
+}
+
 //==============================================================
 //                   TEMPLATE DEFINITIONS
 //==============================================================
@@ -1785,6 +2074,19 @@ template __global__ void kOptimizer32bit2State<half, ADAM>(half* g, half* p, flo
 template __global__ void kOptimizer32bit2State<float, ADAM>(float* g, float* p, float* state1, float* state2, float *unorm, const float max_unorm, const float param_norm,
     const float beta1, const float beta2, const float eps, const float weight_decay,const int step, const float lr, const float gnorm_scale, const bool skip_zeros, const int n);
 
+#define MAKE_Optimizer32bitMultiTensor(oname, gtype) \
+template __global__ void kOptimizer32bitMultiTensor<gtype, oname>(TensorListMetadata32bit<gtype> tl, \
+    const float beta1, const float beta2, const float eps, const float weight_decay, const int step, const float lr, const bool skip_zeros); \
+
+MAKE_Optimizer32bitMultiTensor(ADAM, half)
+MAKE_Optimizer32bitMultiTensor(ADAM, float)
+MAKE_Optimizer32bitMultiTensor(MOMENTUM, half)
+MAKE_Optimizer32bitMultiTensor(MOMENTUM, float)
+MAKE_Optimizer32bitMultiTensor(RMSPROP, half)
+MAKE_Optimizer32bitMultiTensor(RMSPROP, float)
+MAKE_Optimizer32bitMultiTensor(ADAGRAD, half)
+MAKE_Optimizer32bitMultiTensor(ADAGRAD, float)
+
 #define MAKE_PreconditionStatic8bit1State(oname, gtype) \
 template __global__ void kPreconditionOptimizerStatic8bit1State<gtype, oname>(gtype* p, gtype* __restrict__ const g, unsigned char*__restrict__  const state1,  \
                 float *unorm,  \
@@ -1864,7 +2166,8 @@ template __global__ void kOptimizerStatic8bit2StateBlockwise<gtype, oname, block
                 const float beta1, const float beta2, \
                 const float eps, const int step, const float lr, \
                 float* __restrict__ const quantiles1, float* __restrict__ const quantiles2, \
-                float* absmax1, float* absmax2,  \
+                unsigned short* absmax1, unsigned short* absmax2,  \
+                float* k1, float* k2,  \
                 float weight_decay, \
                 const float gnorm_scale, const bool skip_zeros, const int n); \
 
@@ -1877,7 +2180,8 @@ template __global__ void kOptimizerStatic8bit1StateBlockwise<gtype, oname, block
                 const float beta1, const float beta2, \
                 const float eps, const int step, const float lr, \
                 float* __restrict__ const quantiles1, \
-                float* absmax1, \
+                unsigned short* absmax1, \
+                float* k1, \
                 float weight_decay, \
                 const float gnorm_scale, const bool skip_zeros, const int n); \
 
@@ -1887,3 +2191,29 @@ MAKE_OptimizerStatic8bit1StateBlockwise(RMSPROP, float, 2048, 8)
 MAKE_OptimizerStatic8bit1StateBlockwise(RMSPROP, half, 2048, 8)
 MAKE_OptimizerStatic8bit1StateBlockwise(ADAGRAD, float, 2048, 8)
 MAKE_OptimizerStatic8bit1StateBlockwise(ADAGRAD, half, 2048, 8)
+
+#define MAKE_OptimizerStatic8bit2StateBlockwiseMultiTensor(oname, gtype, block_size, num_per_thread) \
+template __global__ void kOptimizerStatic8bit2StateBlockwiseMultiTensor<gtype, oname, block_size, num_per_thread>( \
+                TensorListMetadata8bit<gtype> tl, \
+                const float beta1, const float beta2, \
+                const float eps, const int step, const float lr, \
+                float* __restrict__ const quantiles1, float* __restrict__ const quantiles2, \
+                float weight_decay, const bool skip_zeros); \
+
+MAKE_OptimizerStatic8bit2StateBlockwiseMultiTensor(ADAM, float, 2048, 8)
+MAKE_OptimizerStatic8bit2StateBlockwiseMultiTensor(ADAM, half, 2048, 8)
+
+#define MAKE_OptimizerStatic8bit1StateBlockwiseMultiTensor(oname, gtype, block_size, num_per_thread) \
+template __global__ void kOptimizerStatic8bit1StateBlockwiseMultiTensor<gtype, oname, block_size, num_per_thread>( \
+                TensorListMetadata8bit<gtype> tl, \
+                const float beta1, const float beta2, \
+                const float eps, const int step, const float lr, \
+                float* __restrict__ const quantiles1, \
+                float weight_decay, const bool skip_zeros); \
+
+MAKE_OptimizerStatic8bit1StateBlockwiseMultiTensor(MOMENTUM, float, 2048, 8)
+MAKE_OptimizerStatic8bit1StateBlockwiseMultiTensor(MOMENTUM, half, 2048, 8)
+MAKE_OptimizerStatic8bit1StateBlockwiseMultiTensor(RMSPROP, float, 2048, 8)
+MAKE_OptimizerStatic8bit1StateBlockwiseMultiTensor(RMSPROP, half, 2048, 8)
+MAKE_OptimizerStatic8bit1StateBlockwiseMultiTensor(ADAGRAD, float, 2048, 8)
+MAKE_OptimizerStatic8bit1StateBlockwiseMultiTensor(ADAGRAD, half, 2048, 8)
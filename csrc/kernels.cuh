@@ -9,6 +9,40 @@
 #ifndef kernels
 #define kernels
 
+// multi-tensor launches: tensor descriptors are passed as kernel arguments
+// which are limited to 4KB; these limits keep the metadata below that
+#define MT_MAX_TENSORS 64
+#define MT_MAX_BLOCKS 320
+
+template<typename T> struct TensorListMetadata32bit
+{
+  T* g[MT_MAX_TENSORS];
+  T* p[MT_MAX_TENSORS];
+  float* state1[MT_MAX_TENSORS];
+  float* state2[MT_MAX_TENSORS];
+  int n[MT_MAX_TENSORS];
+  unsigned char block_to_tensor[MT_MAX_BLOCKS];
+  int block_to_chunk[MT_MAX_BLOCKS];
+};
+
+// blockwise 8-bit states need twice the pointers per tensor
+#define MT8_MAX_TENSORS 32
+
+template<typename T> struct TensorListMetadata8bit
+{
+  T* g[MT8_MAX_TENSORS];
+  T* p[MT8_MAX_TENSORS];
+  unsigned char* state1[MT8_MAX_TENSORS];
+  unsigned char* state2[MT8_MAX_TENSORS];
+  unsigned short* absmax1[MT8_MAX_TENSORS];
+  unsigned short* absmax2[MT8_MAX_TENSORS];
+  float* k1[MT8_MAX_TENSORS];
+  float* k2[MT8_MAX_TENSORS];
+  int n[MT8_MAX_TENSORS];
+  unsigned char block_to_tensor[MT_MAX_BLOCKS];
+  int block_to_chunk[MT_MAX_BLOCKS];
+};
+
 template<typename T>__global__ void kEstimateQuantiles(T *__restrict__ const A, float *code, const float offset, const T max_val, const int n);
 
 __global__ void kQuantize(float * code, float * __restrict__ const A, unsigned char *out, const int n);
@@ -41,6 +75,11 @@ __global__ void kOptimizer32bit1State(T* g, T* p,
                 const float beta1, const float eps, const float weight_decay,
                 const int step, const float lr, const float gnorm_scale, const bool skip_zeros, const int n);
 
+template<typename T, int OPTIMIZER>
+__global__ void kOptimizer32bitMultiTensor(TensorListMetadata32bit<T> tl,
+                const float beta1, const float beta2, const float eps, const float weight_decay,
+                const int step, const float lr, const bool skip_zeros);
+
 template<typename T, int OPTIMIZER>
 __global__ void
 kPreconditionOptimizerStatic8bit1State(T* p, T* __restrict__ const g, unsigned char*__restrict__  const state1, 
@@ -90,17 +129,30 @@ template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH> __global__ voi
 		T* p, T* __restrict__ const g, unsigned char* state1, unsigned char* state2,
                 const float beta1, const float beta2, const float eps, const int step, const float lr,
                 float* __restrict__ const quantiles1, float* __restrict__ const quantiles2,
-                float* absmax1, float* absmax2, float weight_decay, const float gnorm_scale, const bool skip_zeros, const int n);
+                unsigned short* absmax1, unsigned short* absmax2, float* k1, float* k2, float weight_decay, const float gnorm_scale, const bool skip_zeros, const int n);
 
 template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH> __global__ void kOptimizerStatic8bit1StateBlockwise(
 		T* p, T* __restrict__ const g, unsigned char* state1,
                 const float beta1, const float beta2,
                 const float eps, const int step, const float lr,
                 float* __restrict__ const quantiles1,
-                float* absmax1,
+                unsigned short* absmax1,
+                float* k1,
                 float weight_decay,
                 const float gnorm_scale, const bool skip_zeros, const int n);
 
+template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH> __global__ void kOptimizerStatic8bit2StateBlockwiseMultiTensor(
+                TensorListMetadata8bit<T> tl,
+                const float beta1, const float beta2, const float eps, const int step, const float lr,
+                float* __restrict__ const quantiles1, float* __restrict__ const quantiles2,
+                float weight_decay, const bool skip_zeros);
+
+template<typename T, int OPTIMIZER, int BLOCK_SIZE, int N_PER_TH> __global__ void kOptimizerStatic8bit1StateBlockwiseMultiTensor(
+                TensorListMetadata8bit<T> tl,
+                const float beta1, const float beta2, const float eps, const int step, const float lr,
+                float* __restrict__ const quantiles1,
+                float weight_decay, const bool skip_zeros);
+
 
 template<typename T, int BLOCK_SIZE, int NUM_VALS> __global__ void kPercentileClipping(T * __restrict__ g, float *gnorm_vec, int step, const int n);
 
@@ -104,6 +104,87 @@ template<typename T, int OPTIMIZER> void optimizer32bit(T* g, T* p,
 	}
 }
 
+template<typename TL, int MAX_TENSORS, int CHUNK_SIZE, typename TENSORS, typename LAUNCH>
+void packMultiTensor(TL &tl, TENSORS &tensors, LAUNCH &launch, int* n, const int num_tensors)
+{
+  // packs the tensors into as few launches as possible; every block processes one
+  // CHUNK_SIZE value chunk of a tensor (see apex multi_tensor_apply). tensors.set(tl, i, t)
+  // writes the pointers of tensor t into slot i and launch(tl, blocks) runs the kernel.
+  int loc_tensor = 0;
+  int loc_block = 0;
+  for(int t = 0; t < num_tensors; t++)
+  {
+    if(n[t] == 0){ continue; }
+    tensors.set(tl, loc_tensor, t);
+    tl.n[loc_tensor] = n[t];
+    loc_tensor++;
+
+    int chunks = n[t]/CHUNK_SIZE;
+    chunks = n[t] % CHUNK_SIZE == 0 ? chunks : chunks + 1;
+    for(int chunk = 0; chunk < chunks; chunk++)
+    {
+      tl.block_to_tensor[loc_block] = loc_tensor - 1;
+      tl.block_to_chunk[loc_block] = chunk;
+      loc_block++;
+
+      bool tensors_full = loc_tensor == MAX_TENSORS && chunk == chunks - 1;
+      bool blocks_full = loc_block == MT_MAX_BLOCKS;
+      bool last_chunk = t == num_tensors - 1 && chunk == chunks - 1;
+      if(tensors_full || blocks_full || last_chunk)
+      {
+        launch(tl, loc_block);
+        loc_block = 0;
+        if(chunk == chunks - 1){ loc_tensor = 0; }
+        else
+        {
+          // the remaining chunks of the current tensor go into the next launch
+          tensors.set(tl, 0, t);
+          tl.n[0] = n[t];
+          loc_tensor = 1;
+        }
+      }
+    }
+  }
+
+  // the last tensors were empty, launch what is left
+  if(loc_block > 0){ launch(tl, loc_block); }
+}
+
+template<typename T> struct Tensors32bit
+{
+  T** g; T** p; float** state1; float** state2;
+
+  void set(TensorListMetadata32bit<T> &tl, int i, int t)
+  {
+    tl.g[i] = g[t];
+    tl.p[i] = p[t];
+    tl.state1[i] = state1[t];
+    tl.state2[i] = state2 == NULL ? NULL : state2[t];
+  }
+};
+
+template<typename T, int OPTIMIZER> struct Launch32bitMultiTensor
+{
+  float beta1; float beta2; float eps; float weight_decay; int step; float lr; bool skip_zeros;
+
+  void operator()(TensorListMetadata32bit<T> &tl, int blocks)
+  {
+    kOptimizer32bitMultiTensor<T, OPTIMIZER><<<blocks, 1024>>>(tl, beta1, beta2, eps, weight_decay, step, lr, skip_zeros);
+    CUDA_CHECK_RETURN(cudaPeekAtLastError());
+  }
+};
+
+template<typename T, int OPTIMIZER> void optimizer32bitMultiTensor(T** g, T** p,
+                float** state1, float** state2, int* n, const int num_tensors,
+                const float beta1, const float beta2, const float eps, const float weight_decay,
+                const int step, const float lr, bool skip_zeros)
+{
+  TensorListMetadata32bit<T> tl;
+  Tensors32bit<T> tensors = {g, p, state1, state2};
+  Launch32bitMultiTensor<T, OPTIMIZER> launch = {beta1, beta2, eps, weight_decay, step, lr, skip_zeros};
+  packMultiTensor<TensorListMetadata32bit<T>, MT_MAX_TENSORS, 4096>(tl, tensors, launch, n, num_tensors);
+}
+
 template<typename T, int OPTIMIZER> void optimizerStatic8bit(T* p, T* g,
                 unsigned char* state1, unsigned char* state2,
                 float *unorm, float max_unorm, float param_norm,
@@ -152,7 +233,7 @@ template<typename T, int OPTIMIZER> void optimizerStatic8bit(T* p, T* g,
 
 template<typename T, int OPTIMIZER> void optimizerStatic8bitBlockwise(T* p, T* g,
                 unsigned char* state1, unsigned char* state2, float beta1, float beta2, float eps, int step, float lr,
-                float* quantiles1, float* quantiles2, float* absmax1, float* absmax2, float weight_decay, const float gnorm_scale, bool skip_zeros, int n)
+                float* quantiles1, float* quantiles2, unsigned short* absmax1, unsigned short* absmax2, float* k1, float* k2, float weight_decay, const float gnorm_scale, bool skip_zeros, int n)
 {
 
 	int blocks = 0;
@@ -162,7 +243,7 @@ template<typename T, int OPTIMIZER> void optimizerStatic8bitBlockwise(T* p, T* g
 			blocks = n/BLOCKSIZE_2STATE;
 			blocks = n % BLOCKSIZE_2STATE == 0 ? blocks : blocks + 1;
 			kOptimizerStatic8bit2StateBlockwise<T, OPTIMIZER, BLOCKSIZE_2STATE, NUM_2STATE><<<blocks, BLOCKSIZE_2STATE/NUM_2STATE>>>(p, g, state1, state2, beta1, beta2, eps, step, lr,
-																														quantiles1, quantiles2, absmax1, absmax2, weight_decay, gnorm_scale, skip_zeros, n);
+																														quantiles1, quantiles2, absmax1, absmax2, k1, k2, weight_decay, gnorm_scale, skip_zeros, n);
 			CUDA_CHECK_RETURN(cudaPeekAtLastError());
 		break;
 		case MOMENTUM:
@@ -171,12 +252,74 @@ template<typename T, int OPTIMIZER> void optimizerStatic8bitBlockwise(T* p, T* g
 			blocks = n/BLOCKSIZE_1STATE;
 			blocks = n % BLOCKSIZE_1STATE == 0 ? blocks : blocks + 1;
 			kOptimizerStatic8bit1StateBlockwise<T, OPTIMIZER, BLOCKSIZE_1STATE, NUM_1STATE><<<blocks, BLOCKSIZE_1STATE/NUM_1STATE>>>(p, g, state1, beta1, beta2, eps, step, lr,
-																														quantiles1, absmax1, weight_decay, gnorm_scale, skip_zeros, n);
+																														quantiles1, absmax1, k1, weight_decay, gnorm_scale, skip_zeros, n);
+			CUDA_CHECK_RETURN(cudaPeekAtLastError());
+		break;
+	}
+}
+
+template<typename T, int OPTIMIZER> void launchStatic8bitBlockwiseMultiTensor(TensorListMetadata8bit<T> &tl, int blocks,
+                float beta1, float beta2, float eps, int step, float lr,
+                float* quantiles1, float* quantiles2, float weight_decay, bool skip_zeros)
+{
+	switch(OPTIMIZER)
+	{
+		case ADAM:
+			kOptimizerStatic8bit2StateBlockwiseMultiTensor<T, OPTIMIZER, BLOCKSIZE_2STATE, NUM_2STATE><<<blocks, BLOCKSIZE_2STATE/NUM_2STATE>>>(tl, beta1, beta2, eps, step, lr,
+																														quantiles1, quantiles2, weight_decay, skip_zeros);
+			CUDA_CHECK_RETURN(cudaPeekAtLastError());
+		break;
+		case MOMENTUM:
+		case RMSPROP:
+    case ADAGRAD:
+			kOptimizerStatic8bit1StateBlockwiseMultiTensor<T, OPTIMIZER, BLOCKSIZE_1STATE, NUM_1STATE><<<blocks, BLOCKSIZE_1STATE/NUM_1STATE>>>(tl, beta1, beta2, eps, step, lr,
+																														quantiles1, weight_decay, skip_zeros);
 			CUDA_CHECK_RETURN(cudaPeekAtLastError());
 		break;
 	}
 }
 
+template<typename T> struct Tensors8bit
+{
+  T** g; T** p; unsigned char** state1; unsigned char** state2;
+  unsigned short** absmax1; unsigned short** absmax2; float** k1; float** k2;
+
+  void set(TensorListMetadata8bit<T> &tl, int i, int t)
+  {
+    tl.g[i] = g[t];
+    tl.p[i] = p[t];
+    tl.state1[i] = state1[t];
+    tl.state2[i] = state2 == NULL ? NULL : state2[t];
+    tl.absmax1[i] = absmax1[t];
+    tl.absmax2[i] = absmax2 == NULL ? NULL : absmax2[t];
+    tl.k1[i] = k1 == NULL ? NULL : k1[t];
+    tl.k2[i] = k2 == NULL ? NULL : k2[t];
+  }
+};
+
+template<typename T, int OPTIMIZER> struct LaunchStatic8bitBlockwiseMultiTensor
+{
+  float beta1; float beta2; float eps; int step; float lr;
+  float* quantiles1; float* quantiles2; float weight_decay; bool skip_zeros;
+
+  void operator()(TensorListMetadata8bit<T> &tl, int blocks)
+  {
+    launchStatic8bitBlockwiseMultiTensor<T, OPTIMIZER>(tl, blocks, beta1, beta2, eps, step, lr, quantiles1, quantiles2, weight_decay, skip_zeros);
+  }
+};
+
+template<typename T, int OPTIMIZER> void optimizerStatic8bitBlockwiseMultiTensor(T** p, T** g,
+                unsigned char** state1, unsigned char** state2, float beta1, float beta2, float eps, int step, float lr,
+                float* quantiles1, float* quantiles2, unsigned short** absmax1, unsigned short** absmax2, float** k1, float** k2,
+                float weight_decay, bool skip_zeros, int* n, const int num_tensors)
+{
+  // every block dequantizes, updates and requantizes one absmax block of a tensor
+  TensorListMetadata8bit<T> tl;
+  Tensors8bit<T> tensors = {g, p, state1, state2, absmax1, absmax2, k1, k2};
+  LaunchStatic8bitBlockwiseMultiTensor<T, OPTIMIZER> launch = {beta1, beta2, eps, step, lr, quantiles1, quantiles2, weight_decay, skip_zeros};
+  packMultiTensor<TensorListMetadata8bit<T>, MT8_MAX_TENSORS, BLOCKSIZE_2STATE>(tl, tensors, launch, n, num_tensors);
+}
+
 
 
 template<typename T> void percentileClipping(T * g, float *gnorm_vec, int step, const int n)
@@ -218,6 +361,21 @@ MAKE_optimizer32bit(RMSPROP, float)
 MAKE_optimizer32bit(ADAGRAD, half)
 MAKE_optimizer32bit(ADAGRAD, float)
 
+#define MAKE_optimizer32bitMultiTensor(name, gtype) \
+template void optimizer32bitMultiTensor<gtype, name>(gtype** g, gtype** p, \
+                float** state1, float** state2, int* n, const int num_tensors, \
+                const float beta1, const float beta2, const float eps, const float weight_decay, \
+                const int step, const float lr, bool skip_zeros);
+
+MAKE_optimizer32bitMultiTensor(ADAM, half)
+MAKE_optimizer32bitMultiTensor(ADAM, float)
+MAKE_optimizer32bitMultiTensor(MOMENTUM, half)
+MAKE_optimizer32bitMultiTensor(MOMENTUM, float)
+MAKE_optimizer32bitMultiTensor(RMSPROP, half)
+MAKE_optimizer32bitMultiTensor(RMSPROP, float)
+MAKE_optimizer32bitMultiTensor(ADAGRAD, half)
+MAKE_optimizer32bitMultiTensor(ADAGRAD, float)
+
 #define MAKE_optimizerStatic8bit(name, gtype) \
 template void optimizerStatic8bit<gtype, name>(gtype* p, gtype* g, unsigned char* state1, unsigned char* state2, \
                 float *unorm, float max_unorm, float param_norm, \
@@ -238,7 +396,7 @@ MAKE_optimizerStatic8bit(RMSPROP, float)
 #define MAKE_optimizerStatic8bitBlockwise(gtype, optim_name) \
 template void optimizerStatic8bitBlockwise<gtype, optim_name>(gtype* p, gtype* g, \
                 unsigned char* state1, unsigned char* state2, float beta1, float beta2, float eps, int step, float lr,  \
-                float* quantiles1, float* quantiles2, float* absmax1, float* absmax2, float weight_decay, const float gnorm_scale, bool skip_zeros, int n); \
+                float* quantiles1, float* quantiles2, unsigned short* absmax1, unsigned short* absmax2, float* k1, float* k2, float weight_decay, const float gnorm_scale, bool skip_zeros, int n); \
 
 MAKE_optimizerStatic8bitBlockwise(half, ADAM);
 MAKE_optimizerStatic8bitBlockwise(float, ADAM);
@@ -249,5 +407,20 @@ MAKE_optimizerStatic8bitBlockwise(float, RMSPROP);
 MAKE_optimizerStatic8bitBlockwise(half, ADAGRAD);
 MAKE_optimizerStatic8bitBlockwise(float, ADAGRAD);
 
+#define MAKE_optimizerStatic8bitBlockwiseMultiTensor(gtype, optim_name) \
+template void optimizerStatic8bitBlockwiseMultiTensor<gtype, optim_name>(gtype** p, gtype** g, \
+                unsigned char** state1, unsigned char** state2, float beta1, float beta2, float eps, int step, float lr,  \
+                float* quantiles1, float* quantiles2, unsigned short** absmax1, unsigned short** absmax2, float** k1, float** k2, \
+                float weight_decay, bool skip_zeros, int* n, const int num_tensors); \
+
+MAKE_optimizerStatic8bitBlockwiseMultiTensor(half, ADAM);
+MAKE_optimizerStatic8bitBlockwiseMultiTensor(float, ADAM);
+MAKE_optimizerStatic8bitBlockwiseMultiTensor(half, MOMENTUM);
+MAKE_optimizerStatic8bitBlockwiseMultiTensor(float, MOMENTUM);
+MAKE_optimizerStatic8bitBlockwiseMultiTensor(half, RMSPROP);
+MAKE_optimizerStatic8bitBlockwiseMultiTensor(float, RMSPROP);
+MAKE_optimizerStatic8bitBlockwiseMultiTensor(half, ADAGRAD);
+MAKE_optimizerStatic8bitBlockwiseMultiTensor(float, ADAGRAD);
+
 template void percentileClipping(float * g, float *gnorm_vec, int step, const int n);
 template void percentileClipping(half * g, float *gnorm_vec, int step, const int n);
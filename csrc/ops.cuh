@@ -52,6 +52,11 @@ template<typename T, int OPTIMIZER> void optimizer32bit(T* g, T* p,
                 float beta1, float beta2, float eps, float weight_decay,
                 int step, float lr, const float gnorm_scale, bool skip_zeros, int n);
 
+template<typename T, int OPTIMIZER> void optimizer32bitMultiTensor(T** g, T** p,
+                float** state1, float** state2, int* n, int num_tensors,
+                float beta1, float beta2, float eps, float weight_decay,
+                int step, float lr, bool skip_zeros);
+
 template<typename T, int OPTIMIZER> void optimizerStatic8bit(T* p, T* g, unsigned char* state1, unsigned char* state2,
                 float *unorm, float max_unorm, float param_norm,
                 float beta1, float beta2,
@@ -63,9 +68,14 @@ template<typename T, int OPTIMIZER> void optimizerStatic8bit(T* p, T* g, unsigne
 
 template<typename T, int OPTIMIZER> void optimizerStatic8bitBlockwise(T* p, T* g,
                 unsigned char* state1, unsigned char* state2, float beta1, float beta2, float eps, int step, float lr, 
-                float* quantiles1, float* quantiles2, float* absmax1, float* absmax2, float weight_decay, const float gnorm_scale, 
+                float* quantiles1, float* quantiles2, unsigned short* absmax1, unsigned short* absmax2, float* k1, float* k2, float weight_decay, const float gnorm_scale, 
 								bool skip_zeros, int n);
 
+template<typename T, int OPTIMIZER> void optimizerStatic8bitBlockwiseMultiTensor(T** p, T** g,
+                unsigned char** state1, unsigned char** state2, float beta1, float beta2, float eps, int step, float lr,
+                float* quantiles1, float* quantiles2, unsigned short** absmax1, unsigned short** absmax2, float** k1, float** k2,
+                float weight_decay, bool skip_zeros, int* n, const int num_tensors);
+
 template<typename T> void percentileClipping(T * g, float *gnorm_vec, int step, const int n);
 
 void histogramScatterAdd2D(float* histogram, int *index1, int *index2, float *src, int maxidx1, int n);
@@ -36,6 +36,22 @@ MAKE_FUNC32(rmsprop, RMSPROP, half, 16)
 MAKE_FUNC32(adagrad, ADAGRAD, float, 32)
 MAKE_FUNC32(adagrad, ADAGRAD, half, 16)
 
+#define MAKE_FUNC32_MULTI_TENSOR(fname, oname, gtype, gbits) \
+void fname##32bit_multi_tensor_g##gbits(gtype **g, gtype **p, \
+               float** state1, float** state2, int *n, const int num_tensors, \
+               const float beta1, const float beta2, const float eps, const float weight_decay, \
+               const int step, const float lr, bool skip_zeros) \
+{ optimizer32bitMultiTensor<gtype, oname>(g, p, state1, state2, n, num_tensors, beta1, beta2, eps, weight_decay, step, lr, skip_zeros); } \
+
+MAKE_FUNC32_MULTI_TENSOR(momentum, MOMENTUM, float, 32)
+MAKE_FUNC32_MULTI_TENSOR(momentum, MOMENTUM, half, 16)
+MAKE_FUNC32_MULTI_TENSOR(adam, ADAM, float, 32)
+MAKE_FUNC32_MULTI_TENSOR(adam, ADAM, half, 16)
+MAKE_FUNC32_MULTI_TENSOR(rmsprop, RMSPROP, float, 32)
+MAKE_FUNC32_MULTI_TENSOR(rmsprop, RMSPROP, half, 16)
+MAKE_FUNC32_MULTI_TENSOR(adagrad, ADAGRAD, float, 32)
+MAKE_FUNC32_MULTI_TENSOR(adagrad, ADAGRAD, half, 16)
+
 #define MAKE_FUNC8(fname, oname, gtype, gbits) \
 void fname##_static_8bit_g##gbits(gtype* p, gtype* g, unsigned char* state1, unsigned char* state2, \
 								float *unorm, float max_unorm, float param_norm, \
@@ -59,8 +75,8 @@ MAKE_FUNC8(rmsprop, RMSPROP, half, 16)
 #define MAKE_BLOCKWISE8(fname, optim_name, gtype, gbits) \
 void fname##_8bit_blockwise_fp##gbits(gtype* p, gtype* g, \
                 unsigned char* state1, unsigned char* state2, float beta1, float beta2, float eps, int step, float lr, \
-                float* quantiles1, float* quantiles2, float* absmax1, float* absmax2, float weight_decay, const float gnorm_scale, bool skip_zeros, int n)\
-{	optimizerStatic8bitBlockwise<gtype, optim_name>(p, g, state1, state2, beta1, beta2, eps, step, lr, quantiles1, quantiles2, absmax1, absmax2, weight_decay, gnorm_scale, skip_zeros, n); }\
+                float* quantiles1, float* quantiles2, unsigned short* absmax1, unsigned short* absmax2, float* k1, float* k2, float weight_decay, const float gnorm_scale, bool skip_zeros, int n)\
+{	optimizerStatic8bitBlockwise<gtype, optim_name>(p, g, state1, state2, beta1, beta2, eps, step, lr, quantiles1, quantiles2, absmax1, absmax2, k1, k2, weight_decay, gnorm_scale, skip_zeros, n); }\
 
 MAKE_BLOCKWISE8(adam, ADAM, half, 16)
 MAKE_BLOCKWISE8(adam, ADAM, float, 32)
@@ -71,6 +87,22 @@ MAKE_BLOCKWISE8(rmsprop, RMSPROP, float, 32)
 MAKE_BLOCKWISE8(adagrad, ADAGRAD, half, 16)
 MAKE_BLOCKWISE8(adagrad, ADAGRAD, float, 32)
 
+#define MAKE_BLOCKWISE8_MULTI_TENSOR(fname, optim_name, gtype, gbits) \
+void fname##_8bit_blockwise_multi_tensor_fp##gbits(gtype** p, gtype** g, \
+                unsigned char** state1, unsigned char** state2, float beta1, float beta2, float eps, int step, float lr, \
+                float* quantiles1, float* quantiles2, unsigned short** absmax1, unsigned short** absmax2, float** k1, float** k2, \
+                float weight_decay, bool skip_zeros, int* n, const int num_tensors)\
+{	optimizerStatic8bitBlockwiseMultiTensor<gtype, optim_name>(p, g, state1, state2, beta1, beta2, eps, step, lr, quantiles1, quantiles2, absmax1, absmax2, k1, k2, weight_decay, skip_zeros, n, num_tensors); }\
+
+MAKE_BLOCKWISE8_MULTI_TENSOR(adam, ADAM, half, 16)
+MAKE_BLOCKWISE8_MULTI_TENSOR(adam, ADAM, float, 32)
+MAKE_BLOCKWISE8_MULTI_TENSOR(momentum, MOMENTUM, half, 16)
+MAKE_BLOCKWISE8_MULTI_TENSOR(momentum, MOMENTUM, float, 32)
+MAKE_BLOCKWISE8_MULTI_TENSOR(rmsprop, RMSPROP, half, 16)
+MAKE_BLOCKWISE8_MULTI_TENSOR(rmsprop, RMSPROP, float, 32)
+MAKE_BLOCKWISE8_MULTI_TENSOR(adagrad, ADAGRAD, half, 16)
+MAKE_BLOCKWISE8_MULTI_TENSOR(adagrad, ADAGRAD, float, 32)
+
 
 void percentileClipping_g32(float * g, float *gnorm_vec, int step, const int n){ percentileClipping<float>(g, gnorm_vec, step, n); }
 void percentileClipping_g16(half * g, float *gnorm_vec, int step, const int n){ percentileClipping<half>(g, gnorm_vec, step, n); }
@@ -115,6 +147,22 @@ extern "C"
 	MAKE_CFUNC32(adagrad, float, 32)
 	MAKE_CFUNC32(adagrad, half, 16)
 
+	#define MAKE_CFUNC32_MULTI_TENSOR(name, gtype, gbits) \
+	void c##name##32bit_multi_tensor_g##gbits(gtype **g, gtype **p, \
+								 float** state1, float** state2, int *n, const int num_tensors, \
+								 const float beta1, const float beta2, const float eps, const float weight_decay, \
+								 const int step, const float lr, bool skip_zeros) \
+	{ name##32bit_multi_tensor_g##gbits(g, p, state1, state2, n, num_tensors, beta1, beta2, eps, weight_decay, step, lr, skip_zeros); } \
+
+	MAKE_CFUNC32_MULTI_TENSOR(adam, float, 32)
+	MAKE_CFUNC32_MULTI_TENSOR(adam, half, 16)
+	MAKE_CFUNC32_MULTI_TENSOR(momentum, float, 32)
+	MAKE_CFUNC32_MULTI_TENSOR(momentum, half, 16)
+	MAKE_CFUNC32_MULTI_TENSOR(rmsprop, float, 32)
+	MAKE_CFUNC32_MULTI_TENSOR(rmsprop, half, 16)
+	MAKE_CFUNC32_MULTI_TENSOR(adagrad, float, 32)
+	MAKE_CFUNC32_MULTI_TENSOR(adagrad, half, 16)
+
 	#define MAKE_CFUNC8(name, gtype, gbits) \
 	void c##name##_static_8bit_g##gbits(gtype* p, gtype* g, unsigned char* state1, unsigned char* state2, \
                 float *unorm, float max_unorm, float param_norm, \
@@ -138,8 +186,8 @@ extern "C"
   #define MAKE_CBLOCKWISE8(fname, optim_name, gtype, gbits) \
   void c##fname##_8bit_blockwise_fp##gbits(gtype* p, gtype* g, \
                 unsigned char* state1, unsigned char* state2, float beta1, float beta2, float eps, int step, float lr,  \
-                float* quantiles1, float* quantiles2, float* absmax1, float* absmax2, float weight_decay, const float gnorm_scale, bool skip_zeros, int n) \
-  {	fname##_8bit_blockwise_fp##gbits(p, g, state1, state2, beta1, beta2, eps, step, lr, quantiles1, quantiles2, absmax1, absmax2, weight_decay, gnorm_scale, skip_zeros, n); } \
+                float* quantiles1, float* quantiles2, unsigned short* absmax1, unsigned short* absmax2, float* k1, float* k2, float weight_decay, const float gnorm_scale, bool skip_zeros, int n) \
+  {	fname##_8bit_blockwise_fp##gbits(p, g, state1, state2, beta1, beta2, eps, step, lr, quantiles1, quantiles2, absmax1, absmax2, k1, k2, weight_decay, gnorm_scale, skip_zeros, n); } \
 
 	MAKE_CBLOCKWISE8(adam, ADAM, half, 16)
 	MAKE_CBLOCKWISE8(adam, ADAM, float, 32)
@@ -150,6 +198,22 @@ extern "C"
 	MAKE_CBLOCKWISE8(adagrad, ADAGRAD, half, 16)
 	MAKE_CBLOCKWISE8(adagrad, ADAGRAD, float, 32)
 
+  #define MAKE_CBLOCKWISE8_MULTI_TENSOR(fname, optim_name, gtype, gbits) \
+  void c##fname##_8bit_blockwise_multi_tensor_fp##gbits(gtype** p, gtype** g, \
+                unsigned char** state1, unsigned char** state2, float beta1, float beta2, float eps, int step, float lr,  \
+                float* quantiles1, float* quantiles2, unsigned short** absmax1, unsigned short** absmax2, float** k1, float** k2, \
+                float weight_decay, bool skip_zeros, int* n, const int num_tensors) \
+  {	fname##_8bit_blockwise_multi_tensor_fp##gbits(p, g, state1, state2, beta1, beta2, eps, step, lr, quantiles1, quantiles2, absmax1, absmax2, k1, k2, weight_decay, skip_zeros, n, num_tensors); } \
+
+	MAKE_CBLOCKWISE8_MULTI_TENSOR(adam, ADAM, half, 16)
+	MAKE_CBLOCKWISE8_MULTI_TENSOR(adam, ADAM, float, 32)
+	MAKE_CBLOCKWISE8_MULTI_TENSOR(momentum, MOMENTUM, half, 16)
+	MAKE_CBLOCKWISE8_MULTI_TENSOR(momentum, MOMENTUM, float, 32)
+	MAKE_CBLOCKWISE8_MULTI_TENSOR(rmsprop, RMSPROP, half, 16)
+	MAKE_CBLOCKWISE8_MULTI_TENSOR(rmsprop, RMSPROP, float, 32)
+	MAKE_CBLOCKWISE8_MULTI_TENSOR(adagrad, ADAGRAD, half, 16)
+	MAKE_CBLOCKWISE8_MULTI_TENSOR(adagrad, ADAGRAD, float, 32)
+
 
 	void cpercentile_clipping_g32(float * g, float *gnorm_vec, int step, const int n){ percentileClipping_g32(g, gnorm_vec, step, n); }
 	void cpercentile_clipping_g16(half * g, float *gnorm_vec, int step, const int n){ percentileClipping_g16(g, gnorm_vec, step, n); }
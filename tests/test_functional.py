@@ -211,3 +211,10 @@ def test_histogram():
 
     torch.testing.assert_allclose(histogram1, histogram2)
     torch.testing.assert_allclose(histogram1.sum(), source.sum())
+
+
+def test_get_ptr_view():
+    A = torch.zeros(2, 1024)
+    A1, A2 = A.chunk(2)
+    assert F.get_ptr(A1).value == A.data_ptr()
+    assert F.get_ptr(A2).value == A.data_ptr() + 1024*A.element_size()
@@ -130,6 +130,105 @@ def test_optimizer32bit(dim1, dim2, gtype, optim_name):
         if optim_name in ['lars', 'lamb']:
             assert bnb_optimizer.state[p2]['unorm_vec'] > 0.0
 
+dim1 = [32, 1024]
+gtype = [torch.float32, torch.float16]
+optimizer_names = ['adam', 'momentum', 'rmsprop', 'adagrad']
+values = list(product(dim1, gtype, optimizer_names))
+names = ['dim1_{0}_gtype_{1}_optim_{2}'.format(*vals) for vals in values]
+@pytest.mark.parametrize("dim1, gtype, optim_name", values, ids=names)
+def test_optimizer32bit_multi_tensor(dim1, gtype, optim_name):
+    # more tensors and chunks than fit into a single multi-tensor launch
+    dim2 = [1, 7, 128, 4097, 10000] + list(range(1, 65))
+    p1 = [torch.randn(dim1,d, device='cuda', dtype=gtype)*0.1 for d in dim2]
+    p2 = [p.clone() for p in p1]
+    p1 = [p.float() for p in p1]
+
+    torch_optimizer = str2optimizers[optim_name][0](p1)
+    bnb_optimizer = str2optimizers[optim_name][1](p2)
+
+    if gtype == torch.float32:
+        atol, rtol = 2e-6, 1e-5
+    else:
+        atol, rtol = 1e-4, 1e-3
+
+    for i in range(20):
+        for w1, w2 in zip(p1, p2):
+            g = torch.randn_like(w2)*0.01
+            w1.grad = g.clone().float()
+            w2.grad = g.clone()
+
+        bnb_optimizer.step()
+        torch_optimizer.step()
+
+        for w1, w2 in zip(p1, p2):
+            for name1, name2 in str2statenames[optim_name]:
+                torch.testing.assert_allclose(torch_optimizer.state[w1][name1], bnb_optimizer.state[w2][name2], atol=atol, rtol=rtol)
+            torch.testing.assert_allclose(w1, w2.float(), atol=atol, rtol=rtol)
+
+            if gtype == torch.float16:
+                w1.data = w1.data.half().float()
+                w2.copy_(w1.data)
+
+
+gtype = [torch.float32, torch.float16]
+optimizer_names = ['adam8bit_blockwise', 'momentum8bit_blockwise', 'rmsprop8bit_blockwise', 'adagrad8bit_blockwise']
+values = list(product(gtype, optimizer_names))
+names = ['gtype_{0}_optim_{1}'.format(*vals) for vals in values]
+@pytest.mark.parametrize("gtype, optim_name", values, ids=names)
+def test_optimizer8bit_blockwise_multi_tensor(gtype, optim_name):
+    # more tensors than fit into a single multi-tensor launch
+    p1 = [torch.randn(d, device='cuda', dtype=gtype)*0.1 for d in [4097, 8192, 10000]*12]
+    p2 = [p.clone() for p in p1]
+    bnb_optimizer = str2optimizers[optim_name][1](p1)
+    name = bnb_optimizer.optimizer_name
+
+    for i in range(10):
+        for w1, w2 in zip(p1, p2):
+            w1.grad = torch.randn_like(w1)*0.01
+            w2.grad = w1.grad.clone()
+
+        if i > 0:
+            states = [{k: v.clone() for k, v in bnb_optimizer.state[w].items() if torch.is_tensor(v)} for w in p1]
+        bnb_optimizer.step()
+        if i == 0:
+            # the first step initializes the states, compare from then on
+            for w1, w2 in zip(p1, p2): w2.copy_(w1)
+            continue
+
+        config = bnb_optimizer.get_config(0, 0, bnb_optimizer.param_groups[0])
+        for w1, w2, state in zip(p1, p2, states):
+            F.optimizer_update_8bit_blockwise(name, w2.grad, w2, state['state1'], state.get('state2'),
+                    config.betas[0], config.betas[1], config.eps, i+1, config.lr,
+                    state['qmap1'], state.get('qmap2'), state['absmax1'], state.get('absmax2'), config.weight_decay)
+
+            torch.testing.assert_allclose(w1, w2, atol=0, rtol=0)
+            for key in ['state1', 'state2', 'absmax1', 'absmax2']:
+                if key in state:
+                    torch.testing.assert_allclose(bnb_optimizer.state[w1][key].float(), state[key].float(), atol=0, rtol=0)
+
+
+def test_optimizer8bit_blockwise_float_absmax():
+    p1 = torch.randn(8192, device='cuda')*0.1
+    p2 = p1.clone()
+    qmap1 = F.create_dynamic_map(signed=True).cuda()
+    qmap2 = F.create_dynamic_map(signed=False).cuda()
+    states = [torch.zeros(8192, dtype=torch.uint8, device='cuda') for i in range(4)]
+    absmax = [torch.zeros(4, dtype=dtype, device='cuda') for dtype in [torch.bfloat16]*2 + [torch.float32]*2]
+
+    # float32 absmax values of older callers give the same updates as bfloat16 ones
+    for step in range(1, 4):
+        g = torch.randn_like(p1)*0.01
+        F.optimizer_update_8bit_blockwise('adam', g, p1, states[0], states[1], 0.9, 0.999, 1e-8, step, 1e-3,
+                qmap1, qmap2, absmax[0], absmax[1])
+        F.optimizer_update_8bit_blockwise('adam', g, p2, states[2], states[3], 0.9, 0.999, 1e-8, step, 1e-3,
+                qmap1, qmap2, absmax[2], absmax[3])
+
+        torch.testing.assert_allclose(p1, p2, atol=0, rtol=0)
+        torch.testing.assert_allclose(states[0], states[2], atol=0, rtol=0)
+        torch.testing.assert_allclose(absmax[0].float(), absmax[2], atol=0, rtol=0)
+        torch.testing.assert_allclose(absmax[1].float(), absmax[3], atol=0, rtol=0)
+
+
 dim1 = [1024]
 dim2 = [32, 1024, 4097]
 gtype = [torch.float32, torch.float16]
@@ -243,7 +342,7 @@ def test_optimizer8bit(dim1, dim2, gtype, optim_name):
         for name1, name2, qmap, max_val in str2statenames[optim_name]:
             #print(bnb_optimizer.state[p2][max_val], name1)
             if 'blockwise' in optim_name:
-                s1 = F.dequantize_blockwise(code=bnb_optimizer.state[p2][qmap], absmax=bnb_optimizer.state[p2][max_val], A=bnb_optimizer.state[p2][name2], blocksize=blocksize)
+                s1 = F.dequantize_blockwise(code=bnb_optimizer.state[p2][qmap], absmax=bnb_optimizer.state[p2][max_val].float(), A=bnb_optimizer.state[p2][name2], blocksize=blocksize)
             else:
                 s1 = F.dequantize(code=bnb_optimizer.state[p2][qmap], absmax=bnb_optimizer.state[p2][max_val], A=bnb_optimizer.state[p2][name2])
             num_not_close = torch.isclose(torch_optimizer.state[p1][name1], s1, atol=atol, rtol=rtol)==0
@@ -275,7 +374,7 @@ def test_optimizer8bit(dim1, dim2, gtype, optim_name):
                 torch.testing.assert_allclose(qmap1, bnb_optimizer.state[p2][qmap])
 
                 if 'blockwise' in optim_name:
-                    s1 = F.dequantize_blockwise(code=bnb_optimizer.state[p2][qmap], absmax=bnb_optimizer.state[p2][max_val], A=bnb_optimizer.state[p2][name2], blocksize=blocksize)
+                    s1 = F.dequantize_blockwise(code=bnb_optimizer.state[p2][qmap], absmax=bnb_optimizer.state[p2][max_val].float(), A=bnb_optimizer.state[p2][name2], blocksize=blocksize)
                 else:
                     s1 = F.dequantize(code=bnb_optimizer.state[p2][qmap], absmax=bnb_optimizer.state[p2][max_val], A=bnb_optimizer.state[p2][name2])
                 torch.testing.assert_allclose(s1cpy, s1)
@@ -296,6 +395,62 @@ def test_optimizer8bit(dim1, dim2, gtype, optim_name):
     #print(sum(relerrors)/len(relerrors))
 
 
+def dequantize_expanded(code, A, absmax, k, blocksize=2048):
+    n = A.numel()
+    C = code[A.flatten().long()]
+    C = torch.nn.functional.pad(C, (0, absmax.numel()*blocksize - n)).view(-1, blocksize)
+    C = torch.sign(C)*torch.abs(C)**(1.0/k.view(-1, 1))
+    return (C*absmax.float().view(-1, 1)).flatten()[:n].view(A.shape)
+
+
+@pytest.mark.parametrize("gtype", [torch.float32, torch.float16], ids=['float', 'half'])
+def test_adam8bit_dynamic_range_expansion(gtype):
+    p1 = torch.randn(1024, 4097, device='cuda', dtype=gtype)*0.1
+    p2 = p1.clone()
+    p3 = p1.clone()
+    p1 = p1.float()
+
+    torch_optimizer = torch.optim.Adam([p1])
+    bnb_optimizer = bnb.optim.Adam8bit([p2], dynamic_range_expansion=True)
+    bnb_optimizer_plain = bnb.optim.Adam8bit([p3])
+
+    names = [('exp_avg', 'state1', 'qmap1', 'absmax1', 'k1'), ('exp_avg_sq', 'state2', 'qmap2', 'absmax2', 'k2')]
+    errors = {name1: [] for name1, name2, qmap, absmax, k in names}
+    errors_plain = {name1: [] for name1, name2, qmap, absmax, k in names}
+    for i in range(50):
+        g = torch.randn(1024, 4097, device='cuda', dtype=gtype)*0.01
+        p1.grad = g.clone().float()
+        p2.grad = g.clone()
+        p3.grad = g.clone()
+
+        bnb_optimizer.step()
+        bnb_optimizer_plain.step()
+        torch_optimizer.step()
+
+        torch.testing.assert_allclose(p1, p2.float(), atol=1e-5, rtol=1e-3)
+
+        state = bnb_optimizer.state[p2]
+        state_plain = bnb_optimizer_plain.state[p3]
+        assert state['k1'].min().item() >= 1.0 and state['k1'].max().item() <= 8.0
+        assert state['k2'].min().item() >= 1.0 and state['k2'].max().item() <= 8.0
+        assert 'k1' not in state_plain and 'k2' not in state_plain
+        for name1, name2, qmap, absmax, k in names:
+            s1 = torch_optimizer.state[p1][name1]
+            s2 = dequantize_expanded(state[qmap], state[name2], state[absmax], state[k])
+            s3 = dequantize_expanded(state_plain[qmap], state_plain[name2], state_plain[absmax],
+                    torch.ones_like(state_plain[absmax], dtype=torch.float32))
+            errors[name1].append(((s1 - s2).abs().sum()/s1.abs().sum()).item())
+            errors_plain[name1].append(((s1 - s3).abs().sum()/s1.abs().sum()).item())
+
+        # both 8-bit optimizers see the same parameters and gradients, so the
+        # difference in the state error comes from the quantization alone
+        p1.data = p1.data.to(gtype).float()
+        p2.copy_(p1.data)
+        p3.copy_(p1.data)
+
+    for name1, name2, qmap, absmax, k in names:
+        assert sum(errors[name1]) < sum(errors_plain[name1])
+
 
 dim1 = [1024]
 dim2 = [32, 1024, 4097]
@@ -406,3 +561,293 @@ def test_str_betas():
     assert strbase.defaults['betas'][1] == 0.95
 
 
+
+
+def test_get_config_cache():
+    p = torch.nn.Parameter(torch.randn(64, 64))
+    mng = bnb.optim.GlobalOptimManager.get_instance()
+    mng.initialize()
+
+    adam = bnb.optim.Adam([p], lr=0.001)
+    group = adam.param_groups[0]
+    config = adam.get_config(0, 0, group)
+    assert adam.get_config(0, 0, group) is config
+    assert config.lr == 0.001
+    assert config.optim_bits == 32
+
+    # lr schedulers change the group in-place
+    group['lr'] = 0.01
+    assert adam.get_config(0, 0, group).lr == 0.01
+    assert config.lr == 0.001
+
+    mng.override_config(p, 'optim_bits', 8)
+    mng.register_parameters([p])
+    assert adam.get_config(0, 0, group).optim_bits == 8
+    assert adam.base_config.optim_bits == 32
+
+    # keys that are not part of the config are ignored
+    mng.override_config(p, key_value_dict={'is_sparse': True, 'lr': 1e-5})
+    mng.register_parameters([p])
+    assert adam.get_config(0, 0, group).lr == 1e-5
+
+
+def test_step_group_configs():
+    p1 = [torch.randn(64, d, device='cuda')*0.1 for d in [1, 64, 4097]]
+    p2 = [p.clone() for p in p1]
+    mng = bnb.optim.GlobalOptimManager.get_instance()
+    mng.initialize()
+    adam1 = bnb.optim.Adam8bit(p1, lr=0.001)
+
+    # an override with the default value takes the per-parameter config path
+    mng.override_config(p2[1], 'eps', 1e-8)
+    mng.register_parameters(p2)
+    adam2 = bnb.optim.Adam8bit(p2, lr=0.001)
+    assert len(mng.index2config) > 0
+
+    for i in range(5):
+        for w1, w2 in zip(p1, p2):
+            w1.grad = torch.randn_like(w1)*0.01
+            w2.grad = w1.grad.clone()
+        adam2.step()
+        mng.index2config, index2config = {}, mng.index2config
+        adam1.step()
+        mng.index2config = index2config
+
+        for w1, w2 in zip(p1, p2):
+            torch.testing.assert_allclose(w1, w2, atol=0, rtol=0)
+    mng.initialize()
+
+
+def test_load_state_dict_step():
+    p = torch.nn.Parameter(torch.randn(64, 64))
+    adam = bnb.optim.Adam([p])
+
+    state_dict = adam.state_dict()
+    param_state = {'step': torch.tensor(10), 'state1': torch.zeros(64, 64), 'state2': torch.zeros(64, 64)}
+    state_dict['state'][0] = param_state
+    adam.load_state_dict(state_dict)
+
+    # the step counter is neither moved nor cast to the parameter dtype
+    assert adam.state[p]['step'].dtype == torch.int64
+    assert adam.state[p]['step'].device.type == 'cpu'
+    assert adam.state[p]['step'] == 10
+    # the input state_dict is not modified
+    assert state_dict['state'][0] is param_state
+    assert adam.state[p] is not param_state
+    # tensors are loaded by reference unless they alias the current state
+    assert adam.state[p]['state1'] is param_state['state1']
+    adam.load_state_dict(adam.state_dict())
+    assert adam.state[p]['state1'].data_ptr() != param_state['state1'].data_ptr()
+    torch.testing.assert_allclose(adam.state[p]['state1'], param_state['state1'])
+
+    # states that are not quantized are loaded as float32, quantized ones stay 8-bit
+    state_dict['state'][0] = {'step': 10, 'state1': torch.zeros(64, 64, dtype=torch.float16),
+            'state2': torch.zeros(64, 64, dtype=torch.uint8), 'absmax2': torch.ones(2, dtype=torch.float64)}
+    adam.load_state_dict(state_dict)
+    assert adam.state[p]['state1'].dtype == torch.float32
+    assert adam.state[p]['state2'].dtype == torch.uint8
+    assert adam.state[p]['absmax2'].dtype == torch.bfloat16
+
+    # other values keep their types
+    state_dict['state'][0] = {'step': 10, 'name': 'adam', 'shape': (64, 64), 'history': [torch.zeros(2, dtype=torch.float64)]}
+    adam.load_state_dict(state_dict)
+    assert adam.state[p]['name'] == 'adam'
+    assert adam.state[p]['shape'] == (64, 64)
+    assert isinstance(adam.state[p]['history'], list)
+    assert adam.state[p]['history'][0].dtype == torch.float32
+
+
+def test_load_state_dict_move_to_device():
+    p = torch.nn.Parameter(torch.randn(64, 64, device='cuda'))
+    adam = bnb.optim.Adam([p])
+    p.grad = torch.randn_like(p)
+    adam.step()
+
+    state_dict = {'state': {k: {key: v.cpu() if torch.is_tensor(v) else v for key, v in values.items()}
+                            for k, values in adam.state_dict()['state'].items()},
+                  'param_groups': adam.state_dict()['param_groups']}
+    adam.load_state_dict(state_dict, move_to_device=False)
+    assert adam.state[p]['state1'].device.type == 'cpu'
+
+    # an optimizer that already stepped moves the loaded state before the update
+    adam.step()
+    assert adam.state[p]['state1'].device == p.device
+    assert adam.state[p]['state2'].device == p.device
+    assert adam.state[p]['step'] == 2
+
+
+def test_state_dict_shared_qmaps():
+    p = torch.nn.Parameter(torch.randn(128, 128))
+    adam = bnb.optim.Adam8bit([p])
+    adam.init_state(adam.param_groups[0], p, 0, 0)
+
+    state_dict = adam.state_dict()
+    assert state_dict['version'] == adam.state_dict_version
+    assert 'qmap1' not in state_dict['state'][0]
+    assert 'qmap2' not in state_dict['state'][0]
+    assert 'qmap1' in adam.state[p]
+
+    adam2 = bnb.optim.Adam8bit([p])
+    adam2.load_state_dict(state_dict)
+    torch.testing.assert_allclose(adam.state[p]['qmap1'], adam2.state[p]['qmap1'])
+    torch.testing.assert_allclose(adam.state[p]['qmap2'], adam2.state[p]['qmap2'])
+
+
+def test_load_state_dict_legacy_qmaps():
+    p1 = torch.nn.Parameter(torch.randn(128, 128))
+    p2 = torch.nn.Parameter(torch.randn(128, 128))
+    for p in [p1, p2]: p.grad = torch.randn_like(p)
+    adam = bnb.optim.Adam8bit([p1, p2])
+    adam.init_states()
+
+    # older checkpoints store a copy of the quantization maps with every parameter
+    state_dict = adam.state_dict()
+    state_dict.pop('version')
+    qmaps = state_dict.pop('qmaps')
+    for values in state_dict['state'].values():
+        values['qmap1'] = qmaps['qmap1'].clone()
+        values['qmap2'] = qmaps['qmap2'].clone()
+
+    adam2 = bnb.optim.Adam8bit([p1, p2])
+    for move_to_device in [True, False]:
+        adam2.load_state_dict(state_dict, move_to_device=move_to_device)
+        assert adam2.state[p1]['qmap1'] is adam2.state[p2]['qmap1']
+        assert adam2.state[p1]['qmap2'] is adam2.state[p2]['qmap2']
+        torch.testing.assert_allclose(adam2.state[p1]['qmap1'], qmaps['qmap1'])
+        torch.testing.assert_allclose(adam2.state[p1]['qmap2'], qmaps['qmap2'])
+
+    state_dict['version'] = adam2.state_dict_version + 1
+    with pytest.raises(ValueError):
+        adam2.load_state_dict(state_dict)
+
+
+def test_init_states_slab():
+    p1 = torch.nn.Parameter(torch.randn(128, 128))
+    p2 = torch.nn.Parameter(torch.randn(64, 128))
+    p3 = torch.nn.Parameter(torch.randn(128, 64).t())
+    for p in [p1, p2, p3]: p.grad = torch.randn_like(p)
+    adam = bnb.optim.Adam8bit([p1, p2, p3])
+    adam.init_states()
+
+    for p in [p1, p2, p3]:
+        state = adam.state[p]
+        assert state['step'] == 0
+        assert state['state1'].shape == p.shape
+        assert state['state1'].stride() == p.stride()
+        assert state['state1'].dtype == torch.uint8
+        assert state['state1'].sum().item() == 0
+        assert state['absmax1'].numel() == (p.numel() + 2047)//2048
+        assert state['absmax1'].dtype == torch.bfloat16
+        assert 'qmap1' in state
+
+    # contiguous parameters share one slab per dtype
+    assert adam.state[p1]['state1'].storage().data_ptr() == adam.state[p2]['state2'].storage().data_ptr()
+    assert adam.state[p1]['absmax1'].storage().data_ptr() == adam.state[p2]['absmax2'].storage().data_ptr()
+    assert adam.state[p3]['state1'].storage().data_ptr() != adam.state[p1]['state1'].storage().data_ptr()
+    assert (adam.state[p2]['state1'].data_ptr() - adam.state[p1]['state1'].data_ptr()) % 256 == 0
+
+
+def test_multi_tensor_key_size_cap():
+    p1 = torch.nn.Parameter(torch.randn(64, 64))
+    p2 = torch.nn.Parameter(torch.randn(320*4096 + 1))
+    p3 = torch.nn.Parameter(torch.randn(320*2048))
+    p4 = torch.nn.Parameter(torch.randn(320*2048 + 1))
+    for p in [p1, p2, p3, p4]: p.grad = torch.randn_like(p)
+    adam = bnb.optim.Adam([p1, p2])
+    adam8bit = bnb.optim.Adam8bit([p3, p4])
+    adam.init_states()
+    adam8bit.init_states()
+
+    # states larger than one multi-tensor launch are updated on their own
+    config = adam.get_config(0, 0, adam.param_groups[0])
+    assert adam.get_multi_tensor_key(p1, adam.state[p1], config) is not None
+    assert adam.get_multi_tensor_key(p2, adam.state[p2], config) is None
+    config = adam8bit.get_config(0, 0, adam8bit.param_groups[0])
+    assert adam8bit.get_multi_tensor_key(p3, adam8bit.state[p3], config) is not None
+    assert adam8bit.get_multi_tensor_key(p4, adam8bit.state[p4], config) is None
+
+
+def test_custom_update_step_not_fused():
+    class CustomAdam(bnb.optim.Adam):
+        def update_step(self, group, p, gindex, pindex):
+            super(CustomAdam, self).update_step(group, p, gindex, pindex)
+
+    assert bnb.optim.Adam([torch.nn.Parameter(torch.randn(4))]).uses_fused_update_step()
+    custom = CustomAdam([torch.nn.Parameter(torch.randn(4))])
+    assert not custom.uses_fused_update_step()
+    custom.fuse_custom_update_step = True
+    assert custom.uses_fused_update_step()
+
+
+def test_init_states_without_specs():
+    class LegacyOptimizer(bnb.optim.optimizer.Optimizer8bit):
+        def init_state(self, group, p, gindex, pindex):
+            state = self.state[p]
+            state['step'] = 0
+            state['state1'] = torch.ones_like(p)
+
+    p = torch.nn.Parameter(torch.randn(64, 64))
+    p.grad = torch.randn_like(p)
+    optimizer = LegacyOptimizer([p], dict(lr=0.001))
+    optimizer.init_states()
+    assert optimizer.state[p]['state1'].sum().item() == p.numel()
+
+
+def test_step_plan():
+    p1 = torch.nn.Parameter(torch.randn(16, 16))
+    p2 = torch.nn.Parameter(torch.randn(16))
+    adam = bnb.optim.Adam([p1])
+
+    plan = adam.get_step_plan()
+    assert [(p, gindex, pindex) for group, p, state, gindex, pindex in plan] == [(p1, 0, 0)]
+    assert adam.get_step_plan() is plan
+
+    adam.add_param_group({'params': [p2]})
+    plan = adam.get_step_plan()
+    assert [(p, gindex, pindex) for group, p, state, gindex, pindex in plan] == [(p1, 0, 0), (p2, 1, 0)]
+    assert plan[1][0] is adam.param_groups[1]
+
+    adam.load_state_dict(adam.state_dict())
+    assert adam.get_step_plan() is not plan
+    assert adam.get_step_plan()[1][0] is adam.param_groups[1]
+    # parameters without gradients get no state
+    assert all(state is None for group, p, state, gindex, pindex in adam.get_step_plan())
+    assert len(adam.state_dict()['state']) == 0
+
+    # the plan refers to the state dicts directly once they exist
+    state = adam.get_plan_state(0)
+    assert state is adam.state[p1]
+    assert adam.get_step_plan()[0][2] is state
+    assert p2 not in adam.state
+
+
+def test_to_gpu_batched():
+    p1 = torch.nn.Parameter(torch.randn(128, 128, device='cuda'))
+    p2 = torch.nn.Parameter(torch.randn(64, 128, device='cuda'))
+    adam = bnb.optim.Adam8bit([p1, p2])
+    for p in [p1, p2]: p.grad = torch.randn_like(p)
+    adam.step()
+
+    state_dict = adam.state_dict()
+    state_dict['state'] = {k: {key: value.cpu() if key != 'step' else value for key, value in v.items()} for k, v in state_dict['state'].items()}
+    adam2 = bnb.optim.Adam8bit([p1, p2])
+    adam2.load_state_dict(state_dict, move_to_device=False)
+    assert adam2.state[p1]['state1'].device.type == 'cpu'
+
+    adam2.to_gpu()
+    for p in [p1, p2]:
+        for k in ['state1', 'state2', 'absmax1', 'absmax2']:
+            assert adam2.state[p][k].device == p.device
+            torch.testing.assert_allclose(adam.state[p][k], adam2.state[p][k])
+    # one transfer per dtype
+    assert adam2.state[p1]['state1'].storage().data_ptr() == adam2.state[p2]['state2'].storage().data_ptr()
+
+    # states larger than the staging buffers are copied in chunks
+    adam3 = bnb.optim.Adam8bit([p1, p2])
+    adam3.to_gpu_staging_bytes = 1000
+    adam3.load_state_dict(state_dict, move_to_device=False)
+    adam3.to_gpu()
+    for p in [p1, p2]:
+        for k in ['state1', 'state2', 'absmax1', 'absmax2']:
+            assert adam3.state[p][k].device == p.device
+            torch.testing.assert_allclose(adam.state[p][k], adam3.state[p][k])